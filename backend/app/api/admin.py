@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.services.tracing_service import tracing_service
+from app.services.stats_service import stats_service, GRANULARITIES
+from app.api.deps import get_admin_user
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(get_admin_user)])
+
+@router.get("/traces")
+async def get_traces(
+    slow_only: bool = Query(False),
+    cluster: bool = Query(False, description="Slow traces from all workers instead of this worker's buffer"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: dict = Depends(get_admin_user)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    if cluster:
+        traces = await tracing_service.cluster_slow_traces(limit)
+    else:
+        traces = tracing_service.local_traces(slow_only=slow_only, limit=limit)
+    return {"worker": tracing_service.worker_id, "traces": traces}
+
+@router.get("/moderation/stats")
+async def get_moderation_stats(
+    granularity: str = Query("hour"),
+    points: int = Query(24, ge=1, le=1440),
+    room_id: str = Query(None),
+    current_user: dict = Depends(get_admin_user)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+    series = await stats_service.series(granularity, points, room_id=room_id)
+    return {"granularity": granularity, "series": series}
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from app.services.supabase_service import supabase_service
+from app.services.conversation_service import conversation_service
 from app.api.deps import get_current_user
 
 router = APIRouter(prefix="/conversations", tags=["conversations"])
@@ -47,13 +48,11 @@ async def create_conversation(
     if req.target_user_id == current_user['id']:
         raise HTTPException(status_code=400, detail="Cannot chat with yourself")
 
-    # TODO: Check if conversation already exists? 
-    # For now, simplistic approach: create new or return existing.
-    # We don't have a "get_existing_conversation" method yet.
-    # Let's just create one. (It might result in duplicates if we don't check, 
-    # but schema doesn't enforce unique participants pair currently).
-    
-    conv_id = await supabase_service.create_conversation(current_user['id'], req.target_user_id)
+    try:
+        # Returns the existing conversation for this pair, or creates it atomically
+        conv_id = await conversation_service.get_or_create_direct(current_user['id'], req.target_user_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid user id")
     if not conv_id:
         raise HTTPException(status_code=500, detail="Failed to create conversation")
         
@@ -1,5 +1,8 @@
 from fastapi import Depends, HTTPException, Header
 from app.services.auth_service import auth_service
+from app.config import get_settings
+
+settings = get_settings()
 
 async def get_current_user(authorization: str = Header(None)):
     if not authorization:
@@ -16,3 +19,9 @@ async def get_current_user(authorization: str = Header(None)):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     return user
+
+async def get_admin_user(user: dict = Depends(get_current_user)):
+    admins = {email.strip().lower() for email in settings.ADMIN_EMAILS.split(",") if email.strip()}
+    if (user.get("email") or "").lower() not in admins:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
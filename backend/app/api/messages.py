@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.services.supabase_service import supabase_service
+from app.api.deps import get_current_user
+import base64
+
+router = APIRouter(prefix="/messages", tags=["messages"])
+
+def encode_cursor(row: dict) -> str:
+    return base64.urlsafe_b64encode(f"{row['rank']!r}:{row['id']}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        rank, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":", 1)
+        return float(rank), message_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/search")
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    cursor_rank, cursor_id = decode_cursor(cursor) if cursor else (None, None)
+    results = await supabase_service.search_messages(
+        current_user['id'], q, limit=limit, cursor_rank=cursor_rank, cursor_id=cursor_id
+    )
+
+    # A full page means there may be more
+    next_cursor = encode_cursor(results[-1]) if len(results) == limit else None
+    return {"results": results, "next_cursor": next_cursor}
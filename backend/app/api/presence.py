@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.services.presence_service import presence_service
+from app.api.deps import get_current_user
+
+router = APIRouter(prefix="/presence", tags=["presence"])
+
+@router.get("/rooms/{room_id}")
+async def get_room_presence(room_id: str, current_user: dict = Depends(get_current_user)):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    members = await presence_service.get_room_members(room_id)
+    return {"room_id": room_id, "members": members}
+
+@router.get("/users")
+async def get_users_presence(
+    ids: str = Query(..., min_length=1, description="Comma-separated user ids"),
+    current_user: dict = Depends(get_current_user)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    user_ids = [i for i in ids.split(",") if i][:200]
+    return await presence_service.get_online_status(user_ids)
+
+@router.get("/users/{user_id}")
+async def get_user_presence(user_id: str, current_user: dict = Depends(get_current_user)):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    status = await presence_service.get_online_status([user_id])
+    return {"user_id": user_id, "online": status[user_id]}
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse
+from app.services.storage_service import storage_service, LocalStorageBackend, UploadTooLarge
+from app.api.deps import get_current_user
+from app.config import get_settings
+import os
+import re
+
+settings = get_settings()
+
+# Attachment ids are SHA-256 hex digests
+DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+router = APIRouter(prefix="/upload", tags=["upload"])
+
+@router.post("")
+async def upload_file(
+    request: Request,
+    filename: str = Query("upload"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Stream the raw request body to storage. The returned `id` is the attachment
+    reference to send as `attachment_id` in a chat message.
+    """
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    max_bytes = settings.UPLOAD_MAX_BYTES
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File exceeds {max_bytes} bytes")
+
+    # The stored content type is detected from the file itself, not the header
+    try:
+        ref = await storage_service.save_stream(request.stream(), filename, max_bytes)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    if not ref:
+        raise HTTPException(status_code=500, detail="Upload failed")
+    return ref
+
+@router.get("/files/{attachment_id}")
+async def get_local_file(attachment_id: str):
+    # Served straight from the content-addressed store: persisted messages keep
+    # this URL long after the Redis upload reference has expired.
+    backend = storage_service.backend
+    if not isinstance(backend, LocalStorageBackend) or not DIGEST.match(attachment_id):
+        raise HTTPException(status_code=404, detail="Not found")
+
+    path = backend.path_for(attachment_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Not found")
+    meta = backend.metadata(attachment_id)
+    return FileResponse(
+        path,
+        media_type=meta.get("content_type") or "application/octet-stream",
+        filename=meta.get("filename") or attachment_id,
+    )
@@ -10,6 +10,67 @@ class Settings(BaseSettings):
     CLOUDINARY_API_SECRET: str
     SUPABASE_URL: str = ""
     SUPABASE_KEY: str = ""
+    # Comma-separated emails of users allowed on the /api/admin endpoints
+    ADMIN_EMAILS: str = ""
+
+    # Near-duplicate spam detection
+    DEDUP_WINDOW_SECONDS: int = 600
+    DEDUP_MIN_SIMILARITY: float = 0.5  # estimated Jaccard similarity of word shingles
+    DEDUP_BURST_USERS: int = 3
+    DEDUP_MIN_LENGTH: int = 20
+    DEDUP_MAX_ROOMS: int = 1000
+    DEDUP_ROOM_MAX_ENTRIES: int = 2000
+    DEDUP_GLOBAL_MAX_ENTRIES: int = 20000
+
+    # Presence registry
+    PRESENCE_FLUSH_INTERVAL: float = 1.0
+    PRESENCE_HEARTBEAT_SECONDS: int = 10
+    PRESENCE_TTL_SECONDS: int = 30
+
+    # Attachments
+    STORAGE_BACKEND: str = "cloudinary"  # cloudinary | local
+    UPLOAD_DIR: str = "uploads"
+    UPLOAD_MAX_BYTES: int = 25 * 1024 * 1024
+    UPLOAD_DEDUP_TTL_SECONDS: int = 30 * 86400
+    UPLOAD_CHUNK_BYTES: int = 6 * 1024 * 1024  # Cloudinary chunked uploads need >= 5 MB chunks
+    MODERATION_MAX_IMAGE_BYTES: int = 15 * 1024 * 1024
+
+    # Per-room message streams for reconnect resume
+    ROOM_STREAM_MAXLEN: int = 1000
+    ROOM_STREAM_TTL_SECONDS: int = 7 * 86400
+
+    # LLM moderation
+    MODERATION_CHUNK_CHARS: int = 2000
+    MODERATION_CHUNK_OVERLAP: int = 200
+    MODERATION_MAX_CHUNKS: int = 8
+    MODERATION_TIMEOUT_SECONDS: float = 15.0
+
+    # Trust-based routing (deliver first, moderate after)
+    TRUST_ROUTING_ENABLED: bool = True
+    TRUST_THRESHOLD: float = 0.9
+    TRUST_MIN_MESSAGES: int = 20
+    TRUST_DECAY: float = 0.95
+    TRUST_COOLDOWN_SECONDS: int = 86400
+    TRUST_TTL_SECONDS: int = 90 * 86400
+
+    # Per-message tracing
+    TRACE_SAMPLE_RATE: float = 0.01
+    TRACE_SLOW_MS: float = 1000.0
+    TRACE_BUFFER_SIZE: int = 1000
+    TRACE_SLOW_BUFFER_SIZE: int = 200
+
+    # Frame coalescing for high fan-out rooms (0 disables)
+    WS_COALESCE_MS: int = 5
+    WS_COALESCE_MIN_CONNECTIONS: int = 50
+
+    # Moderation statistics
+    STATS_COMPACT_INTERVAL_SECONDS: int = 300
+
+    # Message partitions and archival of cold history
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_DIR: str = "archive"
+    MESSAGE_HOT_MONTHS: int = 6
+    ARCHIVE_INTERVAL_SECONDS: int = 3600
 
     class Config:
 
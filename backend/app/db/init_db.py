@@ -1,12 +1,26 @@
+"""
+Schema migration command. Run explicitly before starting the server:
+
+    python -m app.db.init_db
+"""
 from app.db.base import Base
-from app.db.session import engine
+from app.db.session import get_engine
 # Import all models so Base has them registered
-from app.models import User, Conversation, Participant, Message, ModerationLog
+from app.models import User, Conversation, Participant, Message, ModerationLog, ModerationRollup
 
 def init_db():
     print("Initializing Database Tables...")
     try:
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=get_engine())
+        # A partitioned messages table needs partitions before the first insert
+        from app.services.archive_service import archive_service
+        if archive_service.is_partitioned(get_engine()):
+            archive_service.ensure_partitions(get_engine())
+        else:
+            print("messages is not partitioned; run db/partition_messages.sql to enable monthly partitions.")
         print("Database Tables Created Successfully.")
     except Exception as e:
         print(f"Error creating database tables: {e}")
+
+if __name__ == "__main__":
+    init_db()
@@ -1,8 +1,15 @@
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.config import get_settings
+from functools import lru_cache
 
 settings = get_settings()
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+@lru_cache()
+def get_engine():
+    # Built on first use; importing this module does not touch the database driver.
+    from sqlalchemy import create_engine
+    return create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+
+@lru_cache()
+def get_sessionmaker():
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
@@ -1,28 +1,44 @@
+from app.startup import startup_report, warm_up_services, PROCESS_STARTED
 from fastapi import FastAPI
+import asyncio
 import json
+import time
 from app.services.redis_service import redis_client
+from app.services.presence_service import presence_service
+from app.services.stats_service import stats_service
+from app.services.archive_service import archive_service
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Initialize DB Tables
-    try:
-        from app.db.init_db import init_db
-        init_db()
-    except Exception as e:
-        print(f"DB Init Warning: {e}")
+    # Database tables are created by the explicit migration command:
+    #   python -m app.db.init_db
 
     # Startup
     print("Starting up...")
+    started = time.perf_counter()
     try:
-        await redis_client.redis.ping()
+        await asyncio.wait_for(redis_client.redis.ping(), timeout=5)
         print("Redis connected.")
     except Exception as e:
         print(f"Redis connection warning: {e}")
+    startup_report.record("redis ping", time.perf_counter() - started)
+
+    presence_service.start()
+    stats_service.start()
+    archive_service.start()
+    # External clients warm up in the background so a slow dependency
+    # does not delay accepting sockets.
+    warm_up_task = asyncio.create_task(warm_up_services())
+    startup_report.ready_at = time.perf_counter()
         
     yield
     # Shutdown
     print("Shutting down...")
+    warm_up_task.cancel()
+    await presence_service.stop()
+    await stats_service.stop()
+    await archive_service.stop()
     await redis_client.close()
 
 app = FastAPI(lifespan=lifespan)
@@ -30,10 +46,18 @@ app = FastAPI(lifespan=lifespan)
 from app.api.auth import router as auth_router
 from app.api.users import router as users_router
 from app.api.conversations import router as conversations_router
+from app.api.presence import router as presence_router
+from app.api.uploads import router as uploads_router
+from app.api.messages import router as messages_router
+from app.api.admin import router as admin_router
 
 app.include_router(auth_router, prefix="/api")
 app.include_router(users_router, prefix="/api")
 app.include_router(conversations_router, prefix="/api")
+app.include_router(presence_router, prefix="/api")
+app.include_router(uploads_router, prefix="/api")
+app.include_router(messages_router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
 
 @app.get("/")
 async def root():
@@ -49,14 +73,47 @@ async def health_check():
     
     return {"status": "ok", "redis": redis_status}
 
+@app.get("/health/startup")
+async def startup_health():
+    return startup_report.as_dict()
+
 from app.services.websocket_manager import manager
 from app.services.moderation_pipeline import moderation_pipeline
 from app.services.auth_service import auth_service
+from app.services.tracing_service import tracing_service
 from app.api.deps import get_current_user
 from fastapi import WebSocket, WebSocketDisconnect, Depends, HTTPException, Header
 
+# The only message fields a client controls. Everything else (ids, status,
+# moderation, stream ids, event/batch envelopes) is set by the server, so a
+# client cannot forge frames that recipients would render as someone else's.
+MESSAGE_TYPES = ("text", "image", "video", "document")
+
+def build_message(data: str, user_id: str, room_id: str) -> dict:
+    try:
+        parsed = json.loads(data)
+    except ValueError:
+        parsed = None
+    if not isinstance(parsed, dict):
+        parsed = {"content": data}
+
+    content = parsed.get("content")
+    message = {
+        "content": content if isinstance(content, str) else "",
+        "type": parsed.get("type") if parsed.get("type") in MESSAGE_TYPES else "text",
+        "user_id": user_id,
+        "room_id": room_id,
+    }
+    if isinstance(parsed.get("attachment_id"), str):
+        message["attachment_id"] = parsed["attachment_id"]
+    return message
+
 @app.websocket("/ws/{room_id}/{token}")
-async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str):
+async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str,
+                             last_id: str = None, batch: bool = False):
+    # last_id: stream_id of the last message the client saw; missed messages
+    # are replayed before live traffic.
+    # batch: the client accepts coalesced {"event": "batch"} frames in busy rooms.
     # Validate Session
     user = await auth_service.get_current_user(token)
     if not user:
@@ -65,18 +122,14 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str):
         
     user_id = user['id']
 
-    await manager.connect(websocket, room_id, user_id)
+    await manager.connect(websocket, room_id, user_id, last_id=last_id, batch=batch)
     try:
         while True:
             data = await websocket.receive_text()
-            # Parse message
-            try:
-                message_data = json.loads(data)
-            except:
-                message_data = {"content": data}
-            
-            message_data['user_id'] = user_id
-            message_data['room_id'] = room_id
+            trace = tracing_service.start()
+            # Parse message, keeping only client-controlled fields
+            message_data = build_message(data, user_id, room_id)
+            message_data['trace'] = trace
             
             # Process through pipeline
             await moderation_pipeline.process_message(message_data, room_id)
@@ -85,9 +138,32 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str):
         manager.disconnect(websocket, room_id)
 
 @app.get("/api/history/{room_id}")
-async def get_chat_history(room_id: str):
+async def get_chat_history(room_id: str, before: str = None, limit: int = 50):
+    """
+    Latest messages, or messages older than `before` (ISO timestamp) for paging back.
+    Pages reaching past the partitions still in Postgres continue from the archive.
+    """
     from app.services.supabase_service import supabase_service
-    history = await supabase_service.get_history(room_id)
+    from datetime import datetime, timezone
+
+    before_dt = None
+    if before:
+        try:
+            before_dt = datetime.fromisoformat(before.replace("Z", "+00:00"))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid 'before' timestamp")
+        if before_dt.tzinfo is None:
+            before_dt = before_dt.replace(tzinfo=timezone.utc)
+    limit = max(1, min(limit, 200))
+
+    history = await supabase_service.get_history(room_id, limit=limit, before=before_dt.isoformat() if before_dt else None)
+    if len(history) < limit and archive_service.archived_months():
+        oldest = history[0]['created_at'] if history else None
+        archive_before = datetime.fromisoformat(oldest.replace("Z", "+00:00")) if oldest else before_dt
+        archived = await asyncio.to_thread(
+            archive_service.read_history, room_id, archive_before, limit - len(history)
+        )
+        history = archived + history
     return history
 
 
@@ -123,3 +199,4 @@ async def sign_upload(user = Depends(get_current_user)):
         "folder": "chat_app"
     }
 
+startup_report.record("import app.main", time.perf_counter() - PROCESS_STARTED)
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, ForeignKey, DateTime, text, Index
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Column, String, ForeignKey, DateTime, text, Index, Computed
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -16,6 +16,8 @@ class Conversation(Base):
     __tablename__ = "conversations"
     
     id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("uuid_generate_v4()"))
+    # '<smaller user uuid>:<larger user uuid>' for direct chats; unique per pair
+    pair_key = Column(String, unique=True, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
@@ -40,11 +42,25 @@ class Message(Base):
     content = Column(String, nullable=True)
     type = Column(String, server_default="text")
     file_url = Column(String, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Partition key (monthly ranges), so it is part of the primary key
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), primary_key=True)
     status = Column(String, nullable=True) # moderation status
     moderation_status = Column(String, server_default='pending')
     moderation_status = Column(String, server_default='pending')
     moderation_details = Column(JSONB, nullable=True)
+    # Maintained by Postgres on every insert/update; see search_messages() in schema.sql
+    search_vector = Column(TSVECTOR, Computed("to_tsvector('english', coalesce(content, ''))", persisted=True))
+
+    __table_args__ = (
+        Index(
+            "idx_messages_search_vector", "search_vector",
+            postgresql_using="gin",
+            postgresql_where=text("status IS DISTINCT FROM 'blocked'"),
+        ),
+        Index("idx_messages_room_created_at", "room_id", text("created_at DESC")),
+        # Monthly partitions are created by archive_service.ensure_partitions
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
 class ModerationLog(Base):
     __tablename__ = "moderation_logs"
@@ -58,3 +74,11 @@ class ModerationLog(Base):
     explanation = Column(String)
     raw_response = Column(JSONB)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ModerationRollup(Base):
+    __tablename__ = "moderation_rollups"
+
+    granularity = Column(String, primary_key=True) # hour / day
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    counts = Column(JSONB, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
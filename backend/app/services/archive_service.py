@@ -0,0 +1,207 @@
+from app.services.redis_service import redis_client
+from app.config import get_settings
+from collections import deque
+from datetime import date, datetime, timezone
+from typing import List, Optional
+import asyncio
+import gzip
+import json
+import os
+import re
+import shutil
+from urllib.parse import quote
+
+settings = get_settings()
+
+PARTITION_NAME = re.compile(r"^messages_(\d{4})_(\d{2})$")
+ARCHIVE_LOCK_KEY = "archive:messages:lock"
+MESSAGE_COLUMNS = (
+    "id, room_id, user_id, content, type, file_url, status, created_at, "
+    "moderation_status, moderation_details"
+)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"messages_{month:%Y_%m}"
+
+
+class ArchiveService:
+    """
+    Maintenance for the month-partitioned messages table (see db/partition_messages.sql).
+    - Creates upcoming monthly partitions ahead of time.
+    - Exports partitions older than MESSAGE_HOT_MONTHS to gzipped JSONL,
+      one file per room per month under ARCHIVE_DIR, then drops them.
+    - Serves history reads that reach into archived months.
+    """
+
+    def __init__(self):
+        self.root = os.path.join(settings.ARCHIVE_DIR, "messages")
+        self._task: asyncio.Task = None
+
+    # --- Background job ---
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                acquired = await redis_client.redis.set(
+                    ARCHIVE_LOCK_KEY, "1", nx=True, ex=settings.ARCHIVE_INTERVAL_SECONDS
+                )
+                if acquired:
+                    await asyncio.to_thread(self.maintain)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Message archival error: {e}")
+            await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
+
+    def maintain(self):
+        from app.db.session import get_engine
+        from sqlalchemy import text
+
+        engine = get_engine()
+        if not self.is_partitioned(engine):
+            return
+
+        self.ensure_partitions(engine)
+        if settings.ARCHIVE_ENABLED:
+            cutoff = add_months(date.today().replace(day=1), -settings.MESSAGE_HOT_MONTHS)
+            for name, month in self.list_partitions(engine):
+                if month < cutoff:
+                    self.archive_partition(engine, name, month)
+
+    def is_partitioned(self, engine) -> bool:
+        """False until messages has been migrated with db/partition_messages.sql."""
+        from sqlalchemy import text
+
+        with engine.connect() as conn:
+            kind = conn.execute(text("select relkind from pg_class where relname = 'messages'")).scalar()
+        return kind == "p"
+
+    def ensure_partitions(self, engine, months_ahead: int = 2):
+        from sqlalchemy import text
+
+        current = date.today().replace(day=1)
+        with engine.begin() as conn:
+            for i in range(months_ahead + 1):
+                month = add_months(current, i)
+                conn.execute(text(
+                    f'create table if not exists "{partition_name(month)}" partition of messages '
+                    f"for values from ('{month.isoformat()}') to ('{add_months(month, 1).isoformat()}')"
+                ))
+                # No policies on partitions: only reachable through messages' own RLS policies
+                conn.execute(text(f'alter table "{partition_name(month)}" enable row level security'))
+
+    def list_partitions(self, engine):
+        from sqlalchemy import text
+
+        with engine.connect() as conn:
+            names = conn.execute(text(
+                "select c.relname from pg_inherits i "
+                "join pg_class c on c.oid = i.inhrelid "
+                "join pg_class p on p.oid = i.inhparent "
+                "where p.relname = 'messages'"
+            )).scalars().all()
+        partitions = []
+        for name in names:
+            match = PARTITION_NAME.match(name)
+            if match:
+                partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+        return sorted(partitions, key=lambda p: p[1])
+
+    def archive_partition(self, engine, name: str, month: date):
+        """Export one partition, streaming rows grouped by room, then drop it."""
+        from sqlalchemy import text
+
+        final_dir = os.path.join(self.root, f"{month:%Y_%m}")
+        tmp_dir = final_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        rows = 0
+        room_id, out = None, None
+        try:
+            with engine.connect() as conn:
+                result = conn.execution_options(stream_results=True).execute(
+                    text(f'select {MESSAGE_COLUMNS} from "{name}" order by room_id, created_at')
+                )
+                for row in result:
+                    record = dict(row._mapping)
+                    if out is None or record["room_id"] != room_id:
+                        if out:
+                            out.close()
+                        room_id = record["room_id"]
+                        out = gzip.open(os.path.join(tmp_dir, self._room_file(room_id)), "wt", encoding="utf-8")
+                    out.write(json.dumps(record, default=str) + "\n")
+                    rows += 1
+        finally:
+            if out:
+                out.close()
+
+        with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+            json.dump({"partition": name, "rows": rows, "archived_at": datetime.now(timezone.utc).isoformat()}, f)
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.rename(tmp_dir, final_dir)
+
+        with engine.begin() as conn:
+            conn.execute(text(f'drop table "{name}"'))
+        print(f"Archived partition {name}: {rows} rows")
+
+    # --- Reads ---
+    @staticmethod
+    def _room_file(room_id: Optional[str]) -> str:
+        return quote(room_id or "_", safe="") + ".jsonl.gz"
+
+    def archived_months(self) -> List[date]:
+        if not os.path.isdir(self.root):
+            return []
+        months = []
+        for entry in os.listdir(self.root):
+            match = re.match(r"^(\d{4})_(\d{2})$", entry)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months, reverse=True)
+
+    def read_history(self, room_id: str, before: Optional[datetime], limit: int) -> List[dict]:
+        """
+        Newest `limit` allowed archived messages created before `before`, oldest first.
+        Room files are sorted by created_at, so each is streamed until `before` is
+        reached while keeping only the newest rows still needed.
+        """
+        collected: List[dict] = []
+        for month in self.archived_months():
+            if before and datetime(month.year, month.month, 1, tzinfo=timezone.utc) >= before:
+                continue
+            path = os.path.join(self.root, f"{month:%Y_%m}", self._room_file(room_id))
+            if not os.path.exists(path):
+                continue
+            rows = deque(maxlen=limit - len(collected))
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    row = json.loads(line)
+                    if before is not None and datetime.fromisoformat(row["created_at"]) >= before:
+                        break
+                    if row.get("status") == "allowed":
+                        rows.append(row)
+            collected = list(rows) + collected
+            if len(collected) >= limit:
+                break
+        return collected
+
+archive_service = ArchiveService()
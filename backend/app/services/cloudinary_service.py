@@ -1,25 +1,56 @@
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
 from app.config import get_settings
+import threading
 
 settings = get_settings()
 
-cloudinary.config(
-    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-    api_key=settings.CLOUDINARY_API_KEY,
-    api_secret=settings.CLOUDINARY_API_SECRET,
-    secure=True
-)
-
 class CloudinaryService:
     settings = settings
 
-    @staticmethod
-    def upload_file(file, folder="chat_app"):
+    def __init__(self):
+        # The SDK is imported and configured on first use to keep import time low.
+        self._cloudinary = None
+        self._lock = threading.Lock()
+
+    @property
+    def sdk(self):
+        if self._cloudinary is None:
+            with self._lock:
+                if self._cloudinary is None:
+                    import cloudinary
+                    import cloudinary.uploader
+                    import cloudinary.utils
+                    cloudinary.config(
+                        cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+                        api_key=settings.CLOUDINARY_API_KEY,
+                        api_secret=settings.CLOUDINARY_API_SECRET,
+                        secure=True
+                    )
+                    self._cloudinary = cloudinary
+        return self._cloudinary
+
+    def upload_file(self, file, folder="chat_app"):
         """Upload a file to Cloudinary."""
         try:
-            response = cloudinary.uploader.upload(file, folder=folder, resource_type="auto")
+            response = self.sdk.uploader.upload(file, folder=folder, resource_type="auto")
+            return {
+                "url": response.get("secure_url"),
+                "public_id": response.get("public_id"),
+                "format": response.get("format"),
+                "resource_type": response.get("resource_type")
+            }
+        except Exception as e:
+            print(f"Cloudinary Upload Error: {e}")
+            return None
+
+    def upload_large_file(self, path: str, chunk_size: int, folder="chat_app"):
+        """
+        Upload a file from disk in chunks of `chunk_size` bytes (Cloudinary's
+        chunked upload API), so only one chunk is held in memory at a time.
+        """
+        try:
+            response = self.sdk.uploader.upload_large(
+                path, chunk_size=chunk_size, folder=folder, resource_type="auto"
+            )
             return {
                 "url": response.get("secure_url"),
                 "public_id": response.get("public_id"),
@@ -30,9 +61,8 @@ class CloudinaryService:
             print(f"Cloudinary Upload Error: {e}")
             return None
 
-    @staticmethod
-    def generate_signature(params_to_sign):
+    def generate_signature(self, params_to_sign):
         """Generate a signature for client-side uploads."""
-        return cloudinary.utils.api_sign_request(params_to_sign, settings.CLOUDINARY_API_SECRET)
+        return self.sdk.utils.api_sign_request(params_to_sign, settings.CLOUDINARY_API_SECRET)
 
 cloudinary_service = CloudinaryService()
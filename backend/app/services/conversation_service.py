@@ -0,0 +1,37 @@
+from app.services.redis_service import redis_client
+from app.services.supabase_service import supabase_service
+import uuid
+
+# Conversation ids never change for a pair, so the cache only needs a long TTL
+PAIR_CACHE_TTL = 30 * 86400
+
+
+def pair_key(user_id_1: str, user_id_2: str) -> str:
+    """Canonical key for a user pair; matches pair_key in schema.sql (uuid order)."""
+    a, b = sorted(str(uuid.UUID(u)) for u in (user_id_1, user_id_2))
+    return f"{a}:{b}"
+
+
+class ConversationService:
+    async def get_or_create_direct(self, user_id_1: str, user_id_2: str):
+        """
+        Return the single direct conversation between two users, creating it if needed.
+        The common case is one Redis lookup; otherwise an atomic upsert in Postgres.
+        """
+        cache_key = f"conv:pair:{pair_key(user_id_1, user_id_2)}"
+        try:
+            cached = await redis_client.get_value(cache_key)
+            if cached:
+                return cached
+        except Exception as e:
+            print(f"Conversation cache error: {e}")
+
+        conversation_id = await supabase_service.get_or_create_direct_conversation(user_id_1, user_id_2)
+        if conversation_id:
+            try:
+                await redis_client.set_value(cache_key, conversation_id, ttl=PAIR_CACHE_TTL)
+            except Exception as e:
+                print(f"Conversation cache error: {e}")
+        return conversation_id
+
+conversation_service = ConversationService()
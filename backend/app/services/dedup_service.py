@@ -0,0 +1,264 @@
+from app.config import get_settings
+from app.services.gemini_service import is_model_verdict
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+import re
+import time
+
+settings = get_settings()
+
+# MinHash signatures over word shingles (single words and word pairs), so a
+# changed link, an added number or a swapped word only touches a few shingles.
+# The signature is split into BANDS bands of ROWS values; two messages with
+# Jaccard similarity J share at least one band with probability
+# 1 - (1 - J**ROWS)**BANDS, i.e. ~0.74 at J=0.5 and ~0.98 at J=0.7 (the curve's
+# midpoint (1/BANDS)**(1/ROWS) is ~0.46, just below DEDUP_MIN_SIMILARITY).
+# Band hits are only candidates; they are confirmed on the full signature.
+BANDS = 10
+ROWS = 3
+SIGNATURE_SIZE = BANDS * ROWS
+# Only the start of long messages is shingled, bounding signature() cost
+MAX_SHINGLE_WORDS = 256
+# Upper bound on candidates compared per lookup, newest first. Keeps lookups
+# sub-millisecond even while a spam burst fills a single bucket.
+MAX_CANDIDATES = 64
+
+_WORD = re.compile(r"\w+")
+_HASH_MASK = (1 << 64) - 1
+_EMPTY = _HASH_MASK
+# Odd 64-bit constant used to tell apart values borrowed by empty bins
+_BORROW_STEP = 0x9E3779B97F4A7C15
+
+Signature = Tuple[int, ...]
+
+
+def shingles(text: str) -> Set[str]:
+    words = _WORD.findall(text.lower())[:MAX_SHINGLE_WORDS]
+    result = set(words)
+    result.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return result
+
+
+def signature(text: str) -> Signature:
+    """
+    MinHash signature using one-permutation hashing: each shingle is hashed once
+    and the hash picks a bin, which keeps its minimum. Empty bins (short texts)
+    borrow from the next filled bin so every position stays comparable.
+    Shingles use the built-in string hash, which is salted per process; that is
+    fine because signatures only ever live in this process's indexes.
+    """
+    mins = [_EMPTY] * SIGNATURE_SIZE
+    for shingle in shingles(text):
+        h = hash(shingle) & _HASH_MASK
+        bin_, value = h % SIGNATURE_SIZE, h // SIGNATURE_SIZE
+        if value < mins[bin_]:
+            mins[bin_] = value
+
+    if _EMPTY in mins and any(value != _EMPTY for value in mins):
+        filled = list(mins)
+        for i, value in enumerate(mins):
+            if value == _EMPTY:
+                j, distance = i, 0
+                while mins[j] == _EMPTY:
+                    j = (j + 1) % SIGNATURE_SIZE
+                    distance += 1
+                filled[i] = (mins[j] + distance * _BORROW_STEP) & _HASH_MASK
+        mins = filled
+    return tuple(mins)
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / SIGNATURE_SIZE
+
+
+class _Entry:
+    __slots__ = ("signature", "timestamp", "user_id", "verdict")
+
+    def __init__(self, signature: Signature, timestamp: float, user_id: str, verdict: Optional[dict]):
+        self.signature = signature
+        self.timestamp = timestamp
+        self.user_id = user_id
+        self.verdict = verdict
+
+
+class NearDuplicateIndex:
+    """
+    Rolling index of recent message signatures with LSH band buckets.
+    Entries are kept in insertion (= time) order so eviction is a pop from the front.
+    """
+
+    def __init__(self, window_seconds: int, max_entries: int, min_similarity: float):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.min_similarity = min_similarity
+        self._next_id = 0
+        self.entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        # (band, band values) -> entry ids in insertion order
+        self.buckets: Dict[Tuple[int, Signature], Dict[int, None]] = {}
+
+    @staticmethod
+    def _bands(signature: Signature):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS:(band + 1) * ROWS]
+
+    def evict(self, now: float):
+        cutoff = now - self.window_seconds
+        while self.entries:
+            entry_id, entry = next(iter(self.entries.items()))
+            if entry.timestamp >= cutoff and len(self.entries) <= self.max_entries:
+                break
+            self.entries.popitem(last=False)
+            for key in self._bands(entry.signature):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.pop(entry_id, None)
+                    if not bucket:
+                        del self.buckets[key]
+
+    def add(self, signature: Signature, user_id: str, verdict: Optional[dict] = None, now: float = None):
+        now = now if now is not None else time.time()
+        entry_id = self._next_id
+        self._next_id += 1
+        self.entries[entry_id] = _Entry(signature, now, user_id, verdict)
+        for key in self._bands(signature):
+            self.buckets.setdefault(key, {})[entry_id] = None
+        self.evict(now)
+
+    def matches(self, signature: Signature, now: float = None) -> List[_Entry]:
+        """Return recent live entries at least min_similarity similar to the signature."""
+        now = now if now is not None else time.time()
+        self.evict(now)
+        seen: Set[int] = set()
+        found = []
+        for key in self._bands(signature):
+            bucket = self.buckets.get(key)
+            if not bucket:
+                continue
+            for entry_id in reversed(bucket):
+                if entry_id in seen:
+                    continue
+                if len(seen) >= MAX_CANDIDATES:
+                    return found
+                seen.add(entry_id)
+                entry = self.entries[entry_id]
+                if similarity(entry.signature, signature) >= self.min_similarity:
+                    found.append(entry)
+        return found
+
+
+class DedupService:
+    """
+    Near-duplicate spam detection, entirely in memory (no LLM call).
+    - A message near-identical to one the LLM recently blocked (in the same room
+      or globally) inherits that verdict.
+    - A burst of near-duplicates from several distinct users gets a "warn"
+      decision and is flagged for review; it is not blocked, and the warning is
+      never inherited.
+    """
+
+    def __init__(self):
+        self.window_seconds = settings.DEDUP_WINDOW_SECONDS
+        self.min_similarity = settings.DEDUP_MIN_SIMILARITY
+        self.burst_users = settings.DEDUP_BURST_USERS
+        self.min_length = settings.DEDUP_MIN_LENGTH
+        self.max_rooms = settings.DEDUP_MAX_ROOMS
+        self.room_max_entries = settings.DEDUP_ROOM_MAX_ENTRIES
+        self.global_index = NearDuplicateIndex(
+            self.window_seconds, settings.DEDUP_GLOBAL_MAX_ENTRIES, self.min_similarity
+        )
+        # room_id -> index, least recently used first
+        self.room_indexes: "OrderedDict[str, NearDuplicateIndex]" = OrderedDict()
+
+    def _room_index(self, room_id: str) -> NearDuplicateIndex:
+        index = self.room_indexes.get(room_id)
+        if index is None:
+            index = NearDuplicateIndex(self.window_seconds, self.room_max_entries, self.min_similarity)
+            self.room_indexes[room_id] = index
+            if len(self.room_indexes) > self.max_rooms:
+                self.room_indexes.popitem(last=False)
+        else:
+            self.room_indexes.move_to_end(room_id)
+        return index
+
+    def fingerprint(self, text: str) -> Optional[Signature]:
+        """Signature of the text, or None if it is too short to compare meaningfully."""
+        if not text or len(text.strip()) < self.min_length:
+            return None
+        return signature(text)
+
+    def check(self, fingerprint: Signature, room_id: str, user_id: str) -> Optional[dict]:
+        """Return a moderation decision if the message can be decided without the LLM."""
+        now = time.time()
+
+        room_matches = self._room_index(room_id).matches(fingerprint, now)
+        for entry in room_matches:
+            if entry.verdict:
+                return self._inherit(entry.verdict)
+
+        global_matches = self.global_index.matches(fingerprint, now)
+        for entry in global_matches:
+            if entry.verdict:
+                return self._inherit(entry.verdict)
+
+        users = {entry.user_id for entry in global_matches}
+        users.add(user_id)
+        if len(users) >= self.burst_users:
+            # confidence 0: a local heuristic, not a model verdict (see is_model_verdict)
+            return {
+                "category": "spam",
+                "severity": "low",
+                "confidence": 0.0,
+                "explanation": f"Near-duplicate message posted by {len(users)} users within {self.window_seconds}s",
+                "action": "warn",
+                "source": "near_duplicate_burst",
+                "burst_users": len(users),
+            }
+        return None
+
+    def record(self, fingerprint: Signature, room_id: str, user_id: str, decision: dict):
+        """
+        Remember a decided message. Only LLM block verdicts are inherited by later
+        copies; fail-safe blocks (moderation errors, timeouts) are not.
+        """
+        now = time.time()
+        inheritable = decision.get("action") == "block" and is_model_verdict(decision)
+        verdict = dict(decision) if inheritable else None
+        self._room_index(room_id).add(fingerprint, user_id, verdict, now)
+        self.global_index.add(fingerprint, user_id, verdict, now)
+
+    @staticmethod
+    def _inherit(verdict: dict) -> dict:
+        decision = dict(verdict)
+        decision["source"] = "near_duplicate"
+        return decision
+
+dedup_service = DedupService()
+
+
+# Realistic spam variants that must land within DEDUP_MIN_SIMILARITY of each other.
+# Run with: python -m app.services.dedup_service
+VARIANT_PAIRS = [
+    ("Claim your free iPhone now at bit.ly/abc123 before it is gone, limited offer for our members",
+     "Claim your free iPad now at bit.ly/xyz789 before it is gone, limited offer for our members"),
+    ("You have won a $500 gift card! Click the link to verify your account and claim it today",
+     "You've won a $500 gift card! Click the link to verify your account and claim it today!!"),
+    ("Join my crypto signals group, 10x returns guaranteed every week, DM me for the invite",
+     "Join my crypto signals group, 20x returns guaranteed every week, DM me for the invite 4821"),
+]
+UNRELATED_PAIRS = [
+    ("Claim your free iPhone now at bit.ly/abc123 before it is gone, limited offer for our members",
+     "Are we still meeting at the library tomorrow afternoon to finish the slides for the project"),
+]
+
+if __name__ == "__main__":
+    for original, variant in VARIANT_PAIRS + UNRELATED_PAIRS:
+        expected = (original, variant) in VARIANT_PAIRS
+        index = NearDuplicateIndex(600, 100, settings.DEDUP_MIN_SIMILARITY)
+        index.add(signature(original), "sender")
+        started = time.perf_counter()
+        matched = bool(index.matches(signature(variant)))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        score = similarity(signature(original), signature(variant))
+        print(f"{'ok  ' if matched == expected else 'FAIL'} similarity={score:.2f} lookup={elapsed_ms:.3f}ms  {variant[:48]}")
+        assert matched == expected
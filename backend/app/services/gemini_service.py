@@ -1,83 +1,185 @@
-import google.generativeai as genai
 from app.config import get_settings
+import asyncio
 import json
-from typing import Optional
+import threading
+from typing import List, Optional
 
 settings = get_settings()
 
-genai.configure(api_key=settings.GEMINI_API_KEY)
+# Built once and passed as the model's system instruction; the output format
+# is enforced by MODERATION_SCHEMA rather than described in the prompt.
+MODERATION_PROMPT = (
+    "You are a content moderation AI. Analyze the input and return a moderation decision.\n"
+    "Categories: safe, spam, harassment, hate, sexual, violence. "
+    "Severity: low, medium, high. Action: allow, warn, block.\n"
+    'If the content is safe, set category to "safe", severity to "low", and action to "allow".\n'
+    "The input may be one excerpt of a longer message; judge the excerpt on its own."
+)
+
+MODERATION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "category": {"type": "STRING", "enum": ["safe", "spam", "harassment", "hate", "sexual", "violence"]},
+        "severity": {"type": "STRING", "enum": ["low", "medium", "high"]},
+        "confidence": {"type": "NUMBER"},
+        "explanation": {"type": "STRING"},
+        "action": {"type": "STRING", "enum": ["allow", "warn", "block"]},
+    },
+    "required": ["category", "severity", "confidence", "explanation", "action"],
+}
+
+ACTION_RANK = {"allow": 0, "warn": 1, "block": 2}
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2}
+
+
+def split_into_chunks(text: str, size: int, overlap: int, max_chunks: int) -> List[str]:
+    """
+    Split text into overlapping chunks. The chunk size grows if needed so a
+    message never produces more than max_chunks chunks (bounding fan-out).
+    """
+    if len(text) <= size:
+        return [text]
+    size = max(size, -(-len(text) // max_chunks) + overlap)
+    step = size - overlap
+    chunks = []
+    for start in range(0, len(text), step):
+        chunks.append(text[start:start + size])
+        if start + size >= len(text):
+            break
+    return chunks
+
+
+def merge_decisions(decisions: List[dict]) -> dict:
+    """The most severe chunk decision wins."""
+    worst = max(
+        decisions,
+        key=lambda d: (
+            ACTION_RANK.get(d.get("action"), 2),
+            SEVERITY_RANK.get(d.get("severity"), 2),
+            d.get("confidence") or 0.0,
+        ),
+    )
+    merged = dict(worst)
+    merged["chunks_moderated"] = len(decisions)
+    return merged
+
+
+def failsafe_decision(reason: str) -> dict:
+    # Fail safe: block if moderation fails
+    return {
+        "category": "unknown",
+        "severity": "high",
+        "confidence": 0.0,
+        "explanation": f"Moderation failed: {reason}",
+        "action": "block"
+    }
+
+
+def is_model_verdict(decision: dict) -> bool:
+    """False for fail-safe and other synthetic decisions that carry no model judgement."""
+    return decision.get("category") != "unknown" and (decision.get("confidence") or 0.0) > 0
+
 
 class GeminiService:
     def __init__(self):
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        # The SDK is imported, configured and the model built on first use
+        # (or during startup warm-up) instead of at import time.
+        self._genai = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def genai(self):
+        if self._genai is None:
+            with self._lock:
+                if self._genai is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=settings.GEMINI_API_KEY)
+                    self._genai = genai
+        return self._genai
+
+    @property
+    def model(self):
+        if self._model is None:
+            genai = self.genai
+            with self._lock:
+                if self._model is None:
+                    self._model = genai.GenerativeModel(
+                        'gemini-2.5-flash',
+                        system_instruction=MODERATION_PROMPT,
+                        generation_config={
+                            "response_mime_type": "application/json",
+                            "response_schema": MODERATION_SCHEMA,
+                        },
+                    )
+        return self._model
 
     async def moderate_content(self, text: str = None, image_parts: list = None, mime_type: str = None):
         """
         Moderate text or image content using Gemini.
-        Returns a structured JSON decision.
+        Long text is split into overlapping chunks moderated concurrently; the
+        first block verdict cancels the remaining calls. Returns a structured decision.
         """
-        
-        prompt = """
-        You are a content moderation AI. Analyze the input and provide a moderation decision in STRICT JSON format.
-        
-        Rules:
-        - Categories: safe, spam, harassment, hate, sexual, violence
-        - Severity: low, medium, high
-        - Action: allow, warn, block
-        
-        Output JSON schema:
-        {
-            "category": "string",
-            "severity": "string",
-            "confidence": float,
-            "explanation": "string",
-            "action": "string"
-        }
-        
-        If the content is safe, set category to "safe", severity to "low", and action to "allow".
-        """
-        
-        content = [prompt]
+        chunks = split_into_chunks(
+            text or "",
+            settings.MODERATION_CHUNK_CHARS,
+            settings.MODERATION_CHUNK_OVERLAP,
+            settings.MODERATION_MAX_CHUNKS,
+        )
+        # Images go along with the first chunk only
+        tasks = [
+            asyncio.create_task(self._moderate_once(chunk, image_parts if i == 0 else None))
+            for i, chunk in enumerate(chunks)
+        ]
+
+        decisions = []
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=settings.MODERATION_TIMEOUT_SECONDS):
+                decision = await next_done
+                decisions.append(decision)
+                if decision.get("action") == "block":
+                    break
+        except asyncio.TimeoutError:
+            print(f"Gemini Moderation Timeout after {settings.MODERATION_TIMEOUT_SECONDS}s")
+            return failsafe_decision("timeout")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return decisions[0] if len(chunks) == 1 else merge_decisions(decisions)
+
+    async def _moderate_once(self, text: Optional[str], image_parts: list = None) -> dict:
+        content = []
         if text:
             content.append(f"Text to moderate: {text}")
-        
+
         if image_parts:
             # image_parts should be a list of dictionaries compatible with Gemini API
             # e.g. [{"mime_type": "image/jpeg", "data": bytes}]
             content.extend(image_parts)
 
         try:
-            response = self.model.generate_content(content)
-            # Debug: Print raw text
-            print(f"Gemini Raw Response: {response.text}")
-            
-            # Clean up the response to ensure it's valid JSON
-            text_response = response.text.replace("```json", "").replace("```", "").strip()
-            return json.loads(text_response)
+            response = await self.model.generate_content_async(content)
+            # The response schema guarantees a bare JSON object
+            return json.loads(response.text)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             print(f"Gemini Moderation Error: {e}")
             # Debug: Print full error details
             import traceback
             traceback.print_exc()
-            
+
             # Help debug model issues
             if "404" in str(e) or "not found" in str(e):
                 print("\nAvailable Models:")
                 try:
-                    for m in genai.list_models():
+                    for m in self.genai.list_models():
                         if 'generateContent' in m.supported_generation_methods:
                             print(f"- {m.name}")
                 except Exception as list_e:
                     print(f"Failed to list models: {list_e}")
 
-            # Fail safe: block if moderation fails? Or allow with warning? 
-            # Let's return a fail-safe block for now to be safe.
-            return {
-                "category": "unknown",
-                "severity": "high",
-                "confidence": 0.0,
-                "explanation": f"Moderation failed: {str(e)}",
-                "action": "block"
-            }
+            return failsafe_decision(str(e))
 
 gemini_service = GeminiService()
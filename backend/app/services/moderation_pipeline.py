@@ -1,13 +1,28 @@
 from app.services.redis_service import redis_client
-from app.services.gemini_service import gemini_service
+from app.services.gemini_service import gemini_service, failsafe_decision, is_model_verdict
+from app.services.dedup_service import dedup_service
+from app.services.storage_service import storage_service, message_type
+from app.services.trust_service import trust_service
+from app.services.tracing_service import tracing_service
+from app.services.stats_service import stats_service
+from app.config import get_settings
+from typing import Tuple
+import asyncio
 import json
 import time
 import uuid
 
+settings = get_settings()
+
 class ModerationPipeline:
+    def __init__(self):
+        # Keep references to deferred reviews so they are not garbage collected
+        self._reviews = set()
+
     async def process_message(self, message_data: dict, room_id: str):
         """
         Full pipeline: Buffer -> Moderate -> Decision -> Broadcast/Block
+        Trusted users skip the wait: Buffer -> Broadcast -> Moderate -> Retract if blocked
         """
         message_id = str(uuid.uuid4())
         message_data['id'] = message_id
@@ -17,18 +32,77 @@ class ModerationPipeline:
         # 1. Buffer in Redis (Temporary storage)
         # Store for 1 hour just in case
         await redis_client.set_value(f"msg:{message_id}", json.dumps(message_data), ttl=3600)
+        tracing_service.stamp(message_data.get('trace'), "buffered")
+
+        # Attachments arrive as a reference to an upload (see /api/upload), never as bytes.
+        # The message type follows the stored (sniffed) content type, not the client,
+        # so clients render exactly what was moderated.
+        attachment = None
+        if message_data.get('attachment_id'):
+            attachment = await storage_service.get_reference(message_data['attachment_id'])
+        if attachment:
+            message_data['file_url'] = attachment['url']
+            message_data['type'] = message_type(attachment['content_type'])
+        else:
+            message_data['type'] = 'text'
+
+        if await trust_service.is_trusted(message_data['user_id']):
+            # Deliver first, review after
+            message_data['status'] = 'allowed'
+            message_data['moderation'] = {"action": "allow", "category": "pending", "deferred": True}
+            await self.deliver(message_data, room_id)
+            task = asyncio.create_task(self.review(message_data, attachment, room_id))
+            self._reviews.add(task)
+            task.add_done_callback(self._reviews.discard)
+            return
 
         # 2. Moderation
-        # For now, we assume text messages. Future: handle file attachments.
         text_content = message_data.get('content', '')
-        
-        # Skip moderation for system messages or if empty
-        if not text_content:
-            decision = {"action": "allow", "category": "safe"}
-        else:
-            decision = await gemini_service.moderate_content(text=text_content)
+        decision, scored = await self.moderate(text_content, attachment, room_id, message_data['user_id'])
+        tracing_service.stamp(message_data.get('trace'), "moderated")
 
         # 3. Apply Decision
+        self.apply_decision(message_data, decision)
+
+        # 4. Broadcast (Publish to Redis Channel)
+        await self.deliver(message_data, room_id)
+        
+        await self.record_outcome(message_data, decision, room_id, scored)
+
+        # 5. Store in Database (Supabase)
+        await self.persist(message_data)
+
+    async def review(self, message_data: dict, attachment: dict, room_id: str):
+        """Moderate an already delivered message and retract it if it is blocked."""
+        try:
+            text_content = message_data.get('content', '')
+            decision, scored = await self.moderate(text_content, attachment, room_id, message_data['user_id'])
+            self.apply_decision(message_data, decision)
+
+            if decision['action'] == 'block':
+                await self.deliver({
+                    "event": "retract",
+                    "id": message_data['id'],
+                    "room_id": room_id,
+                    "user_id": message_data['user_id'],
+                    "moderation": decision,
+                }, room_id)
+            await self.record_outcome(message_data, decision, room_id, scored)
+
+            await self.persist(message_data)
+        except Exception as e:
+            print(f"Deferred Moderation Error: {e}")
+
+    async def record_outcome(self, message_data: dict, decision: dict, room_id: str, scored: bool):
+        if decision['action'] == 'block' or decision.get('burst_users'):
+             await self.log_flagged_message(message_data)
+        # Only model verdicts move the trust score: skipped moderation, fail-safe
+        # blocks and other synthetic decisions say nothing about the user.
+        if scored:
+            await trust_service.record_decision(message_data['user_id'], decision)
+        await stats_service.record(decision, room_id)
+
+    def apply_decision(self, message_data: dict, decision: dict):
         message_data['moderation'] = decision
         
         if decision['action'] == 'block':
@@ -41,15 +115,20 @@ class ModerationPipeline:
         else:
             message_data['status'] = 'allowed'
 
-        # 4. Broadcast (Publish to Redis Channel)
+    async def deliver(self, message_data: dict, room_id: str):
         # We broadcast EVERYTHING to the Redis channel.
         # The WebSocketManager (subscriber) will handle visibility logic (Sender vs Recipient).
+        # The room stream keeps recent deliveries so reconnecting clients can
+        # resume from their last-seen stream_id instead of refetching history.
+        trace = message_data.get('trace')
+        message_data['stream_id'] = await redis_client.append_to_stream(
+            f"stream:room:{room_id}", {k: v for k, v in message_data.items() if k != 'trace'},
+            maxlen=settings.ROOM_STREAM_MAXLEN, ttl=settings.ROOM_STREAM_TTL_SECONDS
+        )
+        tracing_service.stamp(trace, "published")
         await redis_client.publish(room_id, message_data)
-        
-        if decision['action'] == 'block':
-             await self.log_flagged_message(message_data)
 
-        # 5. Store in Database (Supabase)
+    async def persist(self, message_data: dict):
         try:
             from app.services.supabase_service import supabase_service
             # We fire and forget, or await. Await is safer for consistency.
@@ -59,11 +138,61 @@ class ModerationPipeline:
             await supabase_service.insert_message(message_data)
             
             if 'moderation' in message_data:
-                await supabase_service.log_moderation(message_id, message_data['moderation'])
+                await supabase_service.log_moderation(message_data['id'], message_data['moderation'])
                 
         except Exception as e:
             print(f"Persistence Error: {e}")
 
+    async def moderate(self, text_content: str, attachment: dict, room_id: str, user_id: str) -> Tuple[dict, bool]:
+        """
+        Produce a moderation decision for a message's text and optional attachment.
+        Returns (decision, scored); scored is True only for verdicts that come from
+        the model (directly or inherited from a near-duplicate).
+        """
+        if attachment and attachment.get('content_type', '').startswith('image/'):
+            if attachment['size'] > settings.MODERATION_MAX_IMAGE_BYTES:
+                # An image that cannot be checked is blocked, like an unreadable one
+                return failsafe_decision("image too large for automated moderation"), False
+            try:
+                data = await storage_service.read(attachment)
+            except Exception as e:
+                print(f"Attachment Read Error: {e}")
+                # Same policy as a failed LLM call: an unchecked image is blocked
+                return failsafe_decision(f"attachment unreadable: {e}"), False
+            image_parts = [{"mime_type": attachment['content_type'], "data": data}]
+            decision = await gemini_service.moderate_content(text=text_content or None, image_parts=image_parts)
+            return decision, is_model_verdict(decision)
+
+        decision, scored = await self.moderate_text(text_content, room_id, user_id)
+        if attachment and decision['action'] == 'allow':
+            # Video, documents etc. cannot be checked automatically
+            return {
+                "category": "unknown",
+                "severity": "low",
+                "confidence": 0.0,
+                "explanation": f"Attachment type {attachment.get('content_type')} is not checked by automated moderation",
+                "action": "warn"
+            }, False
+        return decision, scored
+
+    async def moderate_text(self, text_content: str, room_id: str, user_id: str) -> Tuple[dict, bool]:
+        # Skip moderation for system messages or if empty
+        if not text_content:
+            return {"action": "allow", "category": "safe"}, False
+
+        # Near-duplicates of messages the LLM recently blocked inherit that
+        # verdict, and bursts of the same text across users are warned and
+        # flagged for review; both without an LLM call.
+        fingerprint = dedup_service.fingerprint(text_content)
+        decision = None
+        if fingerprint is not None:
+            decision = dedup_service.check(fingerprint, room_id, user_id)
+        if decision is None:
+            decision = await gemini_service.moderate_content(text=text_content)
+        if fingerprint is not None:
+            dedup_service.record(fingerprint, room_id, user_id, decision)
+        return decision, is_model_verdict(decision)
+
     async def log_flagged_message(self, message_data: dict):
         """Log flagged/blocked messages to a Redis list for Admin UI"""
         await redis_client.push_to_queue("admin:flagged_messages", message_data)
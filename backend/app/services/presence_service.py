@@ -0,0 +1,174 @@
+from app.services.redis_service import redis_client
+from app.config import get_settings
+from typing import Dict, List, Set, Tuple
+import asyncio
+import time
+import uuid
+
+settings = get_settings()
+
+# Redis layout:
+#   presence:workers            ZSET  worker_id -> last heartbeat (unix time)
+#   presence:worker:{worker_id} SET   "room_id|user_id" entries owned by the worker
+#   presence:room:{room_id}     SET   "worker_id|user_id"
+#   presence:user:{user_id}     SET   "worker_id|room_id"
+# Liveness comes from the single worker heartbeat, so entries of a crashed
+# worker disappear from reads as soon as its heartbeat goes stale and are
+# removed by the reaper afterwards.
+WORKERS_KEY = "presence:workers"
+REAPER_LOCK_KEY = "presence:reaper_lock"
+
+
+class PresenceService:
+    """
+    Cluster-wide presence registry.
+    Connections are counted locally and only 0 <-> 1 transitions are written to Redis,
+    batched on a timer together with one heartbeat per worker.
+    """
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self.flush_interval = settings.PRESENCE_FLUSH_INTERVAL
+        self.heartbeat_interval = settings.PRESENCE_HEARTBEAT_SECONDS
+        self.ttl = settings.PRESENCE_TTL_SECONDS
+        # (room_id, user_id) -> number of local sockets
+        self.local: Dict[Tuple[str, str], int] = {}
+        # Keys whose Redis state may differ from self.local
+        self.dirty: Set[Tuple[str, str]] = set()
+        self._task: asyncio.Task = None
+        self._last_heartbeat = 0.0
+
+    def track(self, room_id: str, user_id: str):
+        key = (room_id, user_id)
+        self.local[key] = self.local.get(key, 0) + 1
+        if self.local[key] == 1:
+            self.dirty.add(key)
+
+    def untrack(self, room_id: str, user_id: str):
+        key = (room_id, user_id)
+        count = self.local.get(key, 0) - 1
+        if count > 0:
+            self.local[key] = count
+            return
+        self.local.pop(key, None)
+        self.dirty.add(key)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and remove this worker's entries."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self._remove_worker(self.worker_id)
+        except Exception as e:
+            print(f"Presence cleanup error: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                await self.flush()
+                now = time.time()
+                if now - self._last_heartbeat >= self.heartbeat_interval:
+                    await self.heartbeat(now)
+                    await self.reap(now)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Presence flush error: {e}")
+            await asyncio.sleep(self.flush_interval)
+
+    async def flush(self):
+        """Write pending membership changes in a single pipeline."""
+        if not self.dirty:
+            return
+        dirty, self.dirty = self.dirty, set()
+        worker_key = f"presence:worker:{self.worker_id}"
+        pipe = redis_client.redis.pipeline(transaction=False)
+        for room_id, user_id in dirty:
+            if (room_id, user_id) in self.local:
+                pipe.sadd(f"presence:room:{room_id}", f"{self.worker_id}|{user_id}")
+                pipe.sadd(f"presence:user:{user_id}", f"{self.worker_id}|{room_id}")
+                pipe.sadd(worker_key, f"{room_id}|{user_id}")
+            else:
+                pipe.srem(f"presence:room:{room_id}", f"{self.worker_id}|{user_id}")
+                pipe.srem(f"presence:user:{user_id}", f"{self.worker_id}|{room_id}")
+                pipe.srem(worker_key, f"{room_id}|{user_id}")
+        try:
+            await pipe.execute()
+        except Exception:
+            # Retry these keys on the next tick
+            self.dirty |= dirty
+            raise
+
+    async def heartbeat(self, now: float):
+        pipe = redis_client.redis.pipeline(transaction=False)
+        pipe.zadd(WORKERS_KEY, {self.worker_id: now})
+        # Backstop in case this worker dies and no reaper runs for a long time
+        pipe.expire(f"presence:worker:{self.worker_id}", self.ttl * 4)
+        added, _ = await pipe.execute()
+        if added and self._last_heartbeat:
+            # We were reaped (e.g. after a stall): re-publish every local entry
+            self.dirty |= set(self.local)
+        self._last_heartbeat = now
+
+    async def reap(self, now: float):
+        """Remove entries of workers whose heartbeat is stale. One worker reaps per interval."""
+        acquired = await redis_client.redis.set(
+            REAPER_LOCK_KEY, self.worker_id, nx=True, ex=max(1, int(self.heartbeat_interval))
+        )
+        if not acquired:
+            return
+        dead = await redis_client.redis.zrangebyscore(WORKERS_KEY, "-inf", now - self.ttl)
+        for worker_id in dead:
+            await self._remove_worker(worker_id)
+            print(f"Presence: reaped stale worker {worker_id}")
+
+    async def _remove_worker(self, worker_id: str):
+        worker_key = f"presence:worker:{worker_id}"
+        entries = await redis_client.redis.smembers(worker_key)
+        pipe = redis_client.redis.pipeline(transaction=False)
+        for entry in entries:
+            room_id, _, user_id = entry.partition("|")
+            pipe.srem(f"presence:room:{room_id}", f"{worker_id}|{user_id}")
+            pipe.srem(f"presence:user:{user_id}", f"{worker_id}|{room_id}")
+        pipe.delete(worker_key)
+        pipe.zrem(WORKERS_KEY, worker_id)
+        await pipe.execute()
+
+    async def _live_workers(self) -> Set[str]:
+        cutoff = time.time() - self.ttl
+        return set(await redis_client.redis.zrangebyscore(WORKERS_KEY, cutoff, "+inf"))
+
+    async def get_room_members(self, room_id: str) -> List[str]:
+        """User ids with at least one live socket in the room, on any worker."""
+        entries = await redis_client.redis.smembers(f"presence:room:{room_id}")
+        if not entries:
+            return []
+        live = await self._live_workers()
+        members = set()
+        for entry in entries:
+            worker_id, _, user_id = entry.partition("|")
+            if worker_id in live:
+                members.add(user_id)
+        return sorted(members)
+
+    async def get_online_status(self, user_ids: List[str]) -> Dict[str, bool]:
+        pipe = redis_client.redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.smembers(f"presence:user:{user_id}")
+        results = await pipe.execute()
+        live = await self._live_workers()
+        return {
+            user_id: any(entry.partition("|")[0] in live for entry in entries)
+            for user_id, entries in zip(user_ids, results)
+        }
+
+presence_service = PresenceService()
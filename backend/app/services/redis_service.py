@@ -35,6 +35,26 @@ class RedisService:
         """Publish a message to a Redis channel."""
         await self.redis.publish(channel, json.dumps(message))
 
+    async def append_to_stream(self, stream: str, message: dict, maxlen: int, ttl: int = None) -> str:
+        """Append a message to a capped Redis Stream. Returns the entry id."""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xadd(stream, {"data": json.dumps(message)}, maxlen=maxlen, approximate=True)
+        if ttl:
+            pipe.expire(stream, ttl)
+        results = await pipe.execute()
+        return results[0]
+
+    async def read_stream(self, stream: str, after_id: str = None, count: int = None):
+        """Read (entry_id, message) pairs after `after_id` (exclusive), oldest first."""
+        start = f"({after_id}" if after_id else "-"
+        entries = await self.redis.xrange(stream, min=start, max="+", count=count)
+        return [(entry_id, json.loads(fields["data"])) for entry_id, fields in entries]
+
+    async def first_stream_id(self, stream: str):
+        """Id of the oldest entry still retained in the stream, or None."""
+        entries = await self.redis.xrange(stream, min="-", max="+", count=1)
+        return entries[0][0] if entries else None
+
     async def subscribe(self, channel: str):
         """Subscribe to a Redis channel."""
         pubsub = self.redis.pubsub()
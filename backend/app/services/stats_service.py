@@ -0,0 +1,148 @@
+from app.services.redis_service import redis_client
+from app.config import get_settings
+from datetime import datetime, timezone
+from typing import List, Optional
+import asyncio
+import time
+
+settings = get_settings()
+
+# granularity -> (bucket seconds, retention seconds in Redis)
+GRANULARITIES = {
+    "minute": (60, 2 * 86400),
+    "hour": (3600, 35 * 86400),
+    "day": (86400, 400 * 86400),
+}
+# Closed buckets of these granularities are copied into moderation_rollups
+COMPACTED = ("hour", "day")
+COMPACT_LOCK_KEY = "stats:compact_lock"
+
+
+def bucket_start(ts: float, granularity: str) -> int:
+    size = GRANULARITIES[granularity][0]
+    return int(ts // size * size)
+
+
+def bucket_key(granularity: str, start: int, room_id: Optional[str] = None) -> str:
+    key = f"stats:{granularity}:{start}"
+    return f"{key}:room:{room_id}" if room_id is not None else key
+
+
+class StatsService:
+    """
+    Moderation counters updated incrementally per decision.
+    Each (granularity, bucket) is one Redis hash with fields like
+    "total", "action:block", "category:spam", "severity:high"; each room has its
+    own hash per bucket with the same fields, so no hash grows with the number of rooms.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task = None
+
+    async def record(self, decision: dict, room_id: str, ts: float = None):
+        ts = ts if ts is not None else time.time()
+        fields = [
+            "total",
+            f"action:{decision.get('action')}",
+            f"category:{decision.get('category')}",
+            f"severity:{decision.get('severity', 'low')}",
+        ]
+        if decision.get("source"):
+            fields.append(f"source:{decision['source']}")
+        try:
+            pipe = redis_client.redis.pipeline(transaction=False)
+            for granularity, (_, retention) in GRANULARITIES.items():
+                start = bucket_start(ts, granularity)
+                for key in (bucket_key(granularity, start), bucket_key(granularity, start, room_id)):
+                    for field in fields:
+                        pipe.hincrby(key, field, 1)
+                    pipe.expire(key, retention)
+            await pipe.execute()
+        except Exception as e:
+            print(f"Stats update error: {e}")
+
+    async def series(self, granularity: str, points: int, room_id: Optional[str] = None) -> List[dict]:
+        """
+        Most recent `points` buckets, oldest first, for all rooms or for one room.
+        Cost depends only on `points`.
+        """
+        size = GRANULARITIES[granularity][0]
+        current = bucket_start(time.time(), granularity)
+        starts = [current - size * i for i in range(points - 1, -1, -1)]
+
+        pipe = redis_client.redis.pipeline(transaction=False)
+        for start in starts:
+            pipe.hgetall(bucket_key(granularity, start, room_id))
+        buckets = await pipe.execute()
+
+        return [
+            {"bucket": start, "counts": {field: int(value) for field, value in counts.items()}}
+            for start, counts in zip(starts, buckets)
+        ]
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.compact()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Stats compaction error: {e}")
+            await asyncio.sleep(settings.STATS_COMPACT_INTERVAL_SECONDS)
+
+    async def compact(self):
+        """
+        Copy closed hour/day buckets into the moderation_rollups table. One worker per interval.
+        Only the all-rooms counters are compacted; per-room series are served from Redis.
+        """
+        acquired = await redis_client.redis.set(
+            COMPACT_LOCK_KEY, "1", nx=True, ex=settings.STATS_COMPACT_INTERVAL_SECONDS
+        )
+        if not acquired:
+            return
+
+        from app.services.supabase_service import supabase_service
+        now = time.time()
+        for granularity in COMPACTED:
+            size, retention = GRANULARITIES[granularity]
+            watermark_key = f"stats:compacted:{granularity}"
+            last_closed = bucket_start(now, granularity) - size
+            watermark = await redis_client.get_value(watermark_key)
+            start = int(watermark) + size if watermark else last_closed
+            start = max(start, bucket_start(now - retention, granularity))
+            if start > last_closed:
+                continue
+
+            starts = list(range(start, last_closed + 1, size))
+            pipe = redis_client.redis.pipeline(transaction=False)
+            for bucket in starts:
+                pipe.hgetall(bucket_key(granularity, bucket))
+            buckets = await pipe.execute()
+
+            rows = [
+                {
+                    "granularity": granularity,
+                    "bucket_start": datetime.fromtimestamp(bucket, tz=timezone.utc).isoformat(),
+                    "counts": {field: int(value) for field, value in counts.items()},
+                }
+                for bucket, counts in zip(starts, buckets) if counts
+            ]
+            if rows and not await supabase_service.upsert_moderation_rollups(rows):
+                # Leave the watermark so the next run retries
+                continue
+            await redis_client.set_value(watermark_key, str(last_closed))
+
+stats_service = StatsService()
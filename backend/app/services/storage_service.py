@@ -0,0 +1,191 @@
+from app.services.redis_service import redis_client
+from app.config import get_settings
+from typing import AsyncIterator, Optional
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import urllib.request
+
+settings = get_settings()
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+# Leading bytes -> content type. Uploads are typed by their content, never by
+# the client's Content-Type header, so an image cannot be passed off as a
+# document to skip image moderation (or the other way round).
+SNIFF_BYTES = 16
+_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"%PDF-", "application/pdf"),
+    (b"\x1a\x45\xdf\xa3", "video/webm"),
+    (b"PK\x03\x04", "application/zip"),
+]
+# ISO media files (MP4, MOV, HEIC, AVIF) carry their brand at offset 8
+_FTYP_BRANDS = {
+    b"heic": "image/heic", b"heix": "image/heic", b"mif1": "image/heif", b"msf1": "image/heif",
+    b"avif": "image/avif", b"qt  ": "video/quicktime",
+}
+
+
+def sniff_content_type(head: bytes) -> str:
+    """Content type from a file's first SNIFF_BYTES bytes; application/octet-stream if unknown."""
+    for magic, content_type in _SIGNATURES:
+        if head.startswith(magic):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        return _FTYP_BRANDS.get(head[8:12], "video/mp4")
+    return "application/octet-stream"
+
+
+def message_type(content_type: str) -> str:
+    """Chat message type ('image', 'video', 'document') for a stored content type."""
+    if content_type.startswith("image/"):
+        return "image"
+    if content_type.startswith("video/"):
+        return "video"
+    return "document"
+
+
+class StorageBackend:
+    """Blocking storage interface; StorageService calls it off the event loop."""
+    name = "base"
+
+    def save(self, path: str, digest: str, content_type: str, filename: str = None) -> Optional[dict]:
+        """Persist the file at `path`. Returns {"url", "key"} or None on failure."""
+        raise NotImplementedError
+
+    def read(self, ref: dict) -> bytes:
+        raise NotImplementedError
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Filesystem stand-in for object storage, served by GET /api/upload/files/{id}.
+    Each file has a small JSON sidecar with its content type and name, so files
+    stay servable after the Redis reference expires.
+    """
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def save(self, path, digest, content_type, filename: str = None):
+        target = self.path_for(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(path, target)
+        with open(target + ".json", "w") as f:
+            json.dump({"content_type": content_type, "filename": filename}, f)
+        return {"url": f"/api/upload/files/{digest}", "key": target}
+
+    def metadata(self, digest: str) -> dict:
+        try:
+            with open(self.path_for(digest) + ".json") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def read(self, ref):
+        with open(self.path_for(ref["id"]), "rb") as f:
+            return f.read()
+
+
+class CloudinaryStorageBackend(StorageBackend):
+    name = "cloudinary"
+
+    def save(self, path, digest, content_type, filename=None):
+        from app.services.cloudinary_service import cloudinary_service
+        # upload_file() would read the whole file into memory; stream it in chunks
+        result = cloudinary_service.upload_large_file(path, settings.UPLOAD_CHUNK_BYTES)
+        if not result:
+            return None
+        return {"url": result["url"], "key": result["public_id"]}
+
+    def read(self, ref):
+        with urllib.request.urlopen(ref["url"], timeout=10) as response:
+            return response.read()
+
+
+class StorageService:
+    """
+    Streaming uploads: the body is hashed and spooled to a temp file chunk by
+    chunk, so memory per upload stays constant. Files are deduplicated by
+    SHA-256 and the rest of the app only passes around the reference dict.
+    """
+
+    def __init__(self):
+        if settings.STORAGE_BACKEND == "local":
+            self.backend: StorageBackend = LocalStorageBackend(settings.UPLOAD_DIR)
+        else:
+            self.backend = CloudinaryStorageBackend()
+
+    async def save_stream(
+        self, chunks: AsyncIterator[bytes], filename: str, max_bytes: int
+    ) -> Optional[dict]:
+        hasher = hashlib.sha256()
+        size = 0
+        head = b""
+        tmp = tempfile.NamedTemporaryFile(delete=False)
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                hasher.update(chunk)
+                tmp.write(chunk)
+            tmp.close()
+
+            digest = hasher.hexdigest()
+            content_type = sniff_content_type(head)
+            existing = await self.get_reference(digest)
+            # References stored before sniffing may carry a client-declared type
+            if existing and existing.get("content_type") == content_type:
+                return {**existing, "deduplicated": True}
+
+            stored = await asyncio.to_thread(self.backend.save, tmp.name, digest, content_type, filename)
+            if not stored:
+                return None
+
+            ref = {
+                "id": digest,
+                "url": stored["url"],
+                "key": stored["key"],
+                "backend": self.backend.name,
+                "filename": filename,
+                "content_type": content_type,
+                "size": size,
+            }
+            await redis_client.set_value(
+                f"upload:{digest}", json.dumps(ref), ttl=settings.UPLOAD_DEDUP_TTL_SECONDS
+            )
+            return {**ref, "deduplicated": False}
+        finally:
+            tmp.close()
+            os.unlink(tmp.name)
+
+    async def get_reference(self, attachment_id: str) -> Optional[dict]:
+        data = await redis_client.get_value(f"upload:{attachment_id}")
+        return json.loads(data) if data else None
+
+    async def read(self, ref: dict) -> bytes:
+        return await asyncio.to_thread(self.backend.read, ref)
+
+storage_service = StorageService()
@@ -1,17 +1,26 @@
-from supabase import create_client, Client
 from app.config import get_settings
-import os
+import threading
 
 settings = get_settings()
 
 class SupabaseService:
     def __init__(self):
-        # We try to initialize the client if credentials exist
-        self.client: Client = None
-        # Note: In a real scenario, we'd add SUPABASE_URL and SUPABASE_KEY to settings/env
-        # For this runnable demo, if they are missing, we gracefully degrade or warn.
-        # But to answer the user's request, we implement the logic.
-        
+        # The client is created on first use (or during startup warm-up),
+        # so importing this module never blocks on the Supabase SDK.
+        self._client = None
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self._client = self._create_client()
+                    self._initialized = True
+        return self._client
+
+    def _create_client(self):
         # Use settings which loads from .env via Pydantic
         url = settings.SUPABASE_URL
         key = settings.SUPABASE_KEY
@@ -20,12 +29,15 @@ class SupabaseService:
         
         if url and key:
             try:
-                self.client = create_client(url, key)
+                from supabase import create_client
+                client = create_client(url, key)
                 print("Supabase Client initialized successfully.")
+                return client
             except Exception as e:
                 print(f"Supabase Connection Error: {e}")
         else:
             print("Supabase credentials missing in Settings.")
+        return None
 
     async def insert_message(self, message_data: dict):
         """Insert a message into the messages table."""
@@ -69,16 +81,34 @@ class SupabaseService:
         except Exception as e:
             print(f"Supabase Log Error: {e}")
 
-    async def get_history(self, room_id: str, limit: int = 50):
-        """Fetch chat history for a room."""
+    async def upsert_moderation_rollups(self, rows: list):
+        """Insert or replace compacted moderation counters. Returns True on success."""
+        if not self.client:
+            return False
+
+        try:
+            self.client.table("moderation_rollups")\
+                .upsert(rows, on_conflict="granularity,bucket_start")\
+                .execute()
+            return True
+        except Exception as e:
+            print(f"Supabase Rollup Error: {e}")
+            return False
+
+    async def get_history(self, room_id: str, limit: int = 50, before: str = None):
+        """Fetch chat history for a room, optionally only messages older than `before`."""
         if not self.client:
             return []
         
         try:
-            response = self.client.table("messages")\
+            query = self.client.table("messages")\
                 .select("*")\
                 .eq("room_id", room_id)\
-                .eq("status", "allowed")\
+                .eq("status", "allowed")
+            if before:
+                # Bounding created_at lets Postgres prune newer partitions
+                query = query.lt("created_at", before)
+            response = query\
                 .order("created_at", desc=True)\
                 .limit(limit)\
                 .execute()
@@ -93,6 +123,44 @@ class SupabaseService:
             print(f"Supabase Fetch Error: {e}")
             return []
 
+    async def get_history_since(self, room_id: str, since_iso: str, until_iso: str = None, limit: int = 500):
+        """Fetch non-blocked messages created after `since_iso`, oldest first."""
+        if not self.client:
+            return []
+
+        try:
+            query = self.client.table("messages")\
+                .select("*")\
+                .eq("room_id", room_id)\
+                .neq("status", "blocked")\
+                .gt("created_at", since_iso)
+            if until_iso:
+                query = query.lte("created_at", until_iso)
+            response = query.order("created_at").limit(limit).execute()
+            return response.data
+        except Exception as e:
+            print(f"Supabase Fetch Error: {e}")
+            return []
+
+    async def search_messages(self, user_id: str, query: str, limit: int = 20,
+                              cursor_rank: float = None, cursor_id: str = None):
+        """Ranked full-text search over the user's conversations (search_messages() in schema.sql)."""
+        if not self.client:
+            return []
+
+        try:
+            response = self.client.rpc("search_messages", {
+                "p_user_id": user_id,
+                "p_query": query,
+                "p_limit": limit,
+                "p_cursor_rank": cursor_rank,
+                "p_cursor_id": cursor_id,
+            }).execute()
+            return response.data
+        except Exception as e:
+            print(f"Supabase Search Error: {e}")
+            return []
+
     # --- User Management ---
     async def get_user_by_email(self, email: str):
         if not self.client: return None
@@ -163,6 +231,19 @@ class SupabaseService:
             print(f"Create Conversation Error: {e}")
             return None
 
+    async def get_or_create_direct_conversation(self, user_id_1: str, user_id_2: str):
+        """Atomic get-or-create (get_or_create_direct_conversation() in schema.sql)."""
+        if not self.client: return None
+        try:
+            res = self.client.rpc("get_or_create_direct_conversation", {
+                "p_user_a": user_id_1,
+                "p_user_b": user_id_2,
+            }).execute()
+            return res.data
+        except Exception as e:
+            print(f"Get Or Create Conversation Error: {e}")
+            return None
+
     async def get_user_conversations(self, user_id: str):
         if not self.client: return []
         try:
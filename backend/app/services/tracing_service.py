@@ -0,0 +1,83 @@
+from app.services.redis_service import redis_client
+from app.config import get_settings
+from collections import deque
+from typing import Optional
+import json
+import random
+import time
+import uuid
+
+settings = get_settings()
+
+SLOW_TRACES_KEY = "admin:slow_traces"
+
+
+class TracingService:
+    """
+    Per-message tracing from socket receive to recipient send.
+
+    A trace travels inside the message dict (message_data['trace']). Stage
+    offsets are measured with time.monotonic() on the worker that received the
+    message; stages stamped on another worker (after the Redis hop) fall back
+    to wall-clock offsets since monotonic clocks are not comparable across processes.
+    """
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex[:8]
+        self.recent = deque(maxlen=settings.TRACE_BUFFER_SIZE)
+        self.slow = deque(maxlen=settings.TRACE_SLOW_BUFFER_SIZE)
+
+    def start(self) -> dict:
+        return {
+            "id": uuid.uuid4().hex,
+            "worker": self.worker_id,
+            "wall": time.time(),
+            "mono": time.monotonic(),
+            "stages": [{"stage": "received", "ms": 0.0, "worker": self.worker_id}],
+        }
+
+    def stamp(self, trace: Optional[dict], stage: str):
+        if not trace:
+            return
+        if trace["worker"] == self.worker_id:
+            elapsed = time.monotonic() - trace["mono"]
+        else:
+            elapsed = time.time() - trace["wall"]
+        trace["stages"].append({"stage": stage, "ms": round(elapsed * 1000, 3), "worker": self.worker_id})
+
+    async def finish(self, trace: Optional[dict], message_id: str, room_id: str, recipients: int):
+        """Record a completed trace: always if slow, otherwise sampled."""
+        if not trace:
+            return
+        self.stamp(trace, "sent")
+        completed = {
+            "id": trace["id"],
+            "message_id": message_id,
+            "room_id": room_id,
+            "recipients": recipients,
+            "total_ms": trace["stages"][-1]["ms"],
+            "stages": trace["stages"],
+        }
+        if completed["total_ms"] >= settings.TRACE_SLOW_MS:
+            self.slow.append(completed)
+            # Slow traces are also shared so any worker can report them
+            try:
+                pipe = redis_client.redis.pipeline(transaction=False)
+                pipe.lpush(SLOW_TRACES_KEY, json.dumps(completed))
+                pipe.ltrim(SLOW_TRACES_KEY, 0, settings.TRACE_SLOW_BUFFER_SIZE - 1)
+                await pipe.execute()
+            except Exception as e:
+                print(f"Trace export error: {e}")
+        elif random.random() < settings.TRACE_SAMPLE_RATE:
+            self.recent.append(completed)
+
+    def local_traces(self, slow_only: bool = False, limit: int = 100):
+        traces = list(self.slow) if slow_only else list(self.recent) + list(self.slow)
+        traces.sort(key=lambda t: t["total_ms"], reverse=True)
+        return traces[:limit]
+
+    async def cluster_slow_traces(self, limit: int = 100):
+        entries = await redis_client.redis.lrange(SLOW_TRACES_KEY, 0, limit - 1)
+        return [json.loads(entry) for entry in entries]
+
+tracing_service = TracingService()
@@ -0,0 +1,65 @@
+from app.services.redis_service import redis_client
+from app.config import get_settings
+
+settings = get_settings()
+
+# Outcome value fed into the score for each moderation action
+OUTCOMES = {"allow": 1.0, "warn": 0.3, "block": 0.0}
+
+# Atomically folds one outcome into the user's exponentially weighted score.
+# KEYS[1] = trust:{user_id}; ARGV = outcome, decay, ttl
+_UPDATE_SCRIPT = """
+local score = tonumber(redis.call('HGET', KEYS[1], 'score') or '0')
+local decay = tonumber(ARGV[2])
+score = score * decay + tonumber(ARGV[1]) * (1 - decay)
+redis.call('HSET', KEYS[1], 'score', tostring(score))
+redis.call('HINCRBY', KEYS[1], 'count', 1)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+return tostring(score)
+"""
+
+
+class TrustService:
+    """
+    Per-user trust score kept incrementally from model moderation verdicts
+    (the pipeline does not feed it skipped or fail-safe decisions).
+    Trusted users get deliver-first, moderate-after routing; a block puts the
+    user in a cooldown that grows with every offence.
+    """
+
+    def __init__(self):
+        self._update = redis_client.redis.register_script(_UPDATE_SCRIPT)
+
+    async def is_trusted(self, user_id: str) -> bool:
+        if not settings.TRUST_ROUTING_ENABLED:
+            return False
+        try:
+            pipe = redis_client.redis.pipeline(transaction=False)
+            pipe.hmget(f"trust:{user_id}", "score", "count")
+            pipe.exists(f"trust:cooldown:{user_id}")
+            (score, count), in_cooldown = await pipe.execute()
+        except Exception as e:
+            print(f"Trust lookup error: {e}")
+            return False
+        if in_cooldown or score is None or count is None:
+            return False
+        return int(count) >= settings.TRUST_MIN_MESSAGES and float(score) >= settings.TRUST_THRESHOLD
+
+    async def record_decision(self, user_id: str, decision: dict):
+        action = decision.get("action")
+        if action not in OUTCOMES:
+            return
+        try:
+            await self._update(
+                keys=[f"trust:{user_id}"],
+                args=[OUTCOMES[action], settings.TRUST_DECAY, settings.TRUST_TTL_SECONDS],
+            )
+            if action == "block":
+                offences = await redis_client.redis.hincrby(f"trust:{user_id}", "blocks", 1)
+                await redis_client.set_value(
+                    f"trust:cooldown:{user_id}", "1", ttl=settings.TRUST_COOLDOWN_SECONDS * offences
+                )
+        except Exception as e:
+            print(f"Trust update error: {e}")
+
+trust_service = TrustService()
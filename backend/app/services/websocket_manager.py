@@ -1,25 +1,59 @@
 from fastapi import WebSocket
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.services.redis_service import redis_client
+from app.services.presence_service import presence_service
+from app.services.tracing_service import tracing_service
+from app.config import get_settings
+from datetime import datetime, timezone
 import json
 import asyncio
 
+settings = get_settings()
+
+# Rows are inserted (and get created_at) after their stream entry is added;
+# deferred reviews persist well after delivery. The DB half of a resume looks
+# this far past the stream's first entry so such rows are not missed.
+RESUME_DB_SLACK_SECONDS = settings.MODERATION_TIMEOUT_SECONDS + 60
+
+
+def parse_stream_id(stream_id: str):
+    """Redis stream ids are "<ms>-<seq>"; compare them as integer tuples."""
+    ms, _, seq = stream_id.partition("-")
+    return int(ms), int(seq or 0)
+
 class ConnectionManager:
     def __init__(self):
         # Active connections: room_id -> list of {ws: WebSocket, user_id: str}
         self.active_connections: Dict[str, List[Dict[str, Any]]] = {}
+        # Coalescing: room_id -> [(message, trace)] waiting for the room's next tick
+        self.pending: Dict[str, List[tuple]] = {}
+        # room_id -> latest flush task; each flush waits for the previous one
+        self.flushes: Dict[str, asyncio.Task] = {}
 
-    async def connect(self, websocket: WebSocket, room_id: str, user_id: str):
+    async def connect(self, websocket: WebSocket, room_id: str, user_id: str,
+                      last_id: Optional[str] = None, batch: bool = False):
         await websocket.accept()
         if room_id not in self.active_connections:
             self.active_connections[room_id] = []
             # Start a listener for this room if it's the first connection
             asyncio.create_task(self.subscribe_to_room(room_id))
         
-        self.active_connections[room_id].append({"ws": websocket, "user_id": user_id})
+        # batch: the client accepts {"event": "batch", "messages": [...]} frames
+        connection = {"ws": websocket, "user_id": user_id, "batch": batch}
+        if last_id:
+            # Live messages are held back until the missed ones are replayed
+            connection["buffer"] = []
+        self.active_connections[room_id].append(connection)
+        presence_service.track(room_id, user_id)
+
+        if last_id:
+            await self.resume(connection, room_id, last_id)
 
     def disconnect(self, websocket: WebSocket, room_id: str):
         if room_id in self.active_connections:
+            for conn in self.active_connections[room_id]:
+                if conn['ws'] == websocket:
+                    presence_service.untrack(room_id, conn['user_id'])
             # Filter out the specific websocket connection
             self.active_connections[room_id] = [
                 conn for conn in self.active_connections[room_id] 
@@ -28,35 +62,185 @@ class ConnectionManager:
             if not self.active_connections[room_id]:
                 del self.active_connections[room_id]
 
+    @staticmethod
+    def is_visible(connection: Dict[str, Any], message: dict) -> bool:
+        """Blocked messages are only visible to their sender."""
+        if message.get('status') == 'blocked':
+            return connection['user_id'] == message.get('user_id')
+        return True
+
+    @staticmethod
+    def _replayed(message: dict, replayed: set) -> bool:
+        """True if the message was already sent from the DB (events such as retract never are)."""
+        return not message.get('event') and message.get('id') in replayed
+
+    async def resume(self, connection: Dict[str, Any], room_id: str, last_id: str):
+        """
+        Replay messages the client missed since `last_id` (a stream_id it has seen),
+        then release live messages buffered meanwhile.
+        Falls back to the database when the gap is older than the stream retains.
+        """
+        ws = connection['ws']
+        stream = f"stream:room:{room_id}"
+        sent_id = last_id
+        replayed = set()
+        try:
+            parse_stream_id(last_id)
+            first_id = await redis_client.first_stream_id(stream)
+            if first_id is None or parse_stream_id(first_id) > parse_stream_id(last_id):
+                # Part of the gap was trimmed from the stream
+                from app.services.supabase_service import supabase_service
+                since = datetime.fromtimestamp(parse_stream_id(last_id)[0] / 1000, tz=timezone.utc)
+                until = None
+                if first_id is not None:
+                    until = datetime.fromtimestamp(
+                        parse_stream_id(first_id)[0] / 1000 + RESUME_DB_SLACK_SECONDS, tz=timezone.utc
+                    ).isoformat()
+                for row in await supabase_service.get_history_since(room_id, since.isoformat(), until):
+                    await ws.send_text(json.dumps(row, default=str))
+                    replayed.add(row.get('id'))
+                entries = await redis_client.read_stream(stream)
+            else:
+                entries = await redis_client.read_stream(stream, after_id=last_id)
+
+            for entry_id, message in entries:
+                message['stream_id'] = entry_id
+                sent_id = entry_id
+                if self._replayed(message, replayed):
+                    continue
+                if self.is_visible(connection, message):
+                    await ws.send_text(json.dumps(message))
+
+            # Nothing awaits between the final check and removing the buffer,
+            # so no live message can slip in between.
+            while connection['buffer']:
+                message = connection['buffer'].pop(0)
+                stream_id = message.get('stream_id')
+                if stream_id and parse_stream_id(stream_id) <= parse_stream_id(sent_id):
+                    continue
+                if self._replayed(message, replayed):
+                    continue
+                if self.is_visible(connection, message):
+                    await ws.send_text(json.dumps(message))
+        except ValueError:
+            print(f"Invalid resume id for room {room_id}: {last_id}")
+        except Exception as e:
+            print(f"Resume error for room {room_id}: {e}")
+
+        # Only non-empty if the replay failed part way: deliver live traffic anyway
+        for message in connection.pop('buffer', []):
+            if self.is_visible(connection, message):
+                try:
+                    await ws.send_text(json.dumps(message))
+                except Exception as e:
+                    print(f"Error sending message: {e}")
+                    break
+
     async def broadcast(self, message_data: dict, room_id: str):
         """
         Broadcast message to room.
         Logic:
         - If 'blocked': Send ONLY to sender (message_data['user_id']).
         - Else: Send to all.
+        Returns the number of local connections the message was sent to.
         """
+        sent = 0
         if room_id in self.active_connections:
             message_json = json.dumps(message_data) if isinstance(message_data, dict) else message_data
             parsed_msg = message_data if isinstance(message_data, dict) else json.loads(message_data)
             
-            sender_id = parsed_msg.get('user_id')
-            status = parsed_msg.get('status')
-
             for connection in self.active_connections[room_id]:
                 try:
-                    # Visibility Logic
-                    if status == 'blocked':
-                        if connection['user_id'] == sender_id:
-                            await connection['ws'].send_text(message_json)
-                        # Else: Do not send to others
-                    else:
-                        # Allowed or Warning: Send to all
+                    if 'buffer' in connection:
+                        # Still replaying missed messages for this connection
+                        connection['buffer'].append(parsed_msg)
+                    elif self.is_visible(connection, parsed_msg):
                         await connection['ws'].send_text(message_json)
+                        sent += 1
                         
                 except Exception as e:
                     print(f"Error sending message: {e}")
                     # Remove dead connection? 
                     # manager.disconnect usually handles cleanup on WebSocketDisconnect exception in endpoint
+        return sent
+
+    def should_coalesce(self, room_id: str) -> bool:
+        if settings.WS_COALESCE_MS <= 0:
+            return False
+        # Once a tick is pending or flushing, keep queueing so messages stay in order
+        return room_id in self.pending or room_id in self.flushes or \
+            len(self.active_connections.get(room_id, [])) >= settings.WS_COALESCE_MIN_CONNECTIONS
+
+    def enqueue(self, message: dict, trace: Optional[dict], room_id: str):
+        if room_id not in self.pending:
+            self.pending[room_id] = []
+            task = asyncio.create_task(self._flush_after_tick(room_id, self.flushes.get(room_id)))
+            self.flushes[room_id] = task
+            task.add_done_callback(lambda done: self._forget_flush(room_id, done))
+        self.pending[room_id].append((message, trace))
+
+    def _forget_flush(self, room_id: str, task: asyncio.Task):
+        if self.flushes.get(room_id) is task:
+            del self.flushes[room_id]
+
+    async def _flush_after_tick(self, room_id: str, previous: Optional[asyncio.Task]):
+        await asyncio.sleep(settings.WS_COALESCE_MS / 1000)
+        # A flush slower than one tick (many sockets, a slow client) must finish
+        # before the next one sends, or recipients could see messages out of order.
+        # Messages arriving meanwhile join this tick's batch.
+        if previous is not None:
+            await asyncio.wait([previous])
+        items = self.pending.pop(room_id, [])
+        try:
+            sent = await self.broadcast_batch([message for message, _ in items], room_id)
+        except Exception as e:
+            print(f"Error flushing batch for room {room_id}: {e}")
+            sent = 0
+        for message, trace in items:
+            await tracing_service.finish(trace, message.get('id'), room_id, sent)
+
+    async def broadcast_batch(self, messages: List[dict], room_id: str) -> int:
+        """
+        Deliver a tick's worth of messages: one frame per recipient for clients
+        that negotiated batching, one frame per message for the rest.
+        Visibility is still applied per recipient.
+        """
+        sent = 0
+        encoded = [json.dumps(message) for message in messages]
+        public = [i for i, message in enumerate(messages) if message.get('status') != 'blocked']
+        blocked_senders = {m.get('user_id') for m in messages if m.get('status') == 'blocked'}
+        # Most recipients see the same messages, so their frame is built once
+        public_frame = self._batch_frame([encoded[i] for i in public])
+
+        for connection in self.active_connections.get(room_id, []):
+            try:
+                if 'buffer' in connection:
+                    # Still replaying missed messages for this connection
+                    connection['buffer'].extend(messages)
+                    continue
+                if connection['user_id'] in blocked_senders:
+                    visible = [encoded[i] for i, m in enumerate(messages) if self.is_visible(connection, m)]
+                    frame = self._batch_frame(visible)
+                else:
+                    visible = [encoded[i] for i in public]
+                    frame = public_frame
+                if not visible:
+                    continue
+                if connection['batch']:
+                    await connection['ws'].send_text(frame)
+                else:
+                    for message_json in visible:
+                        await connection['ws'].send_text(message_json)
+                sent += 1
+            except Exception as e:
+                print(f"Error sending message: {e}")
+        return sent
+
+    @staticmethod
+    def _batch_frame(encoded: List[str]) -> str:
+        if len(encoded) == 1:
+            return encoded[0]
+        return '{"event": "batch", "messages": [' + ", ".join(encoded) + ']}'
 
     async def subscribe_to_room(self, room_id: str):
         """
@@ -77,7 +261,14 @@ class ConnectionManager:
                     # Parse JSON to dict for broadcast logic
                     try:
                         msg_dict = json.loads(data)
-                        await self.broadcast(msg_dict, room_id)
+                        # Traces are internal; strip before sending to clients
+                        trace = msg_dict.pop('trace', None)
+                        tracing_service.stamp(trace, "subscribed")
+                        if self.should_coalesce(room_id):
+                            self.enqueue(msg_dict, trace, room_id)
+                        else:
+                            sent = await self.broadcast(msg_dict, room_id)
+                            await tracing_service.finish(trace, msg_dict.get('id'), room_id, sent)
                     except:
                          # Fallback for plain strings
                          # But we expect JSON now
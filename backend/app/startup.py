@@ -0,0 +1,65 @@
+import asyncio
+import time
+from typing import Callable, Dict
+
+# Process-relative timings for the import-time and startup-time report.
+PROCESS_STARTED = time.perf_counter()
+WARMUP_TIMEOUT_SECONDS = 30
+
+
+class StartupReport:
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.ready_at: float = None
+
+    def record(self, name: str, seconds: float):
+        self.timings[name] = round(seconds * 1000, 2)
+
+    def as_dict(self):
+        return {
+            "timings_ms": self.timings,
+            "errors": self.errors,
+            "ready_ms": round((self.ready_at - PROCESS_STARTED) * 1000, 2) if self.ready_at else None,
+        }
+
+    def print(self):
+        print("Startup report:")
+        for name, ms in self.timings.items():
+            print(f"  {name:<28} {ms:>9.2f} ms")
+        for name, error in self.errors.items():
+            print(f"  {name:<28} FAILED: {error}")
+
+startup_report = StartupReport()
+
+
+async def _warm_up(name: str, init: Callable[[], object]):
+    started = time.perf_counter()
+    try:
+        # Client constructors are blocking, so each one runs in its own thread.
+        await asyncio.wait_for(asyncio.to_thread(init), timeout=WARMUP_TIMEOUT_SECONDS)
+    except Exception as e:
+        startup_report.errors[name] = str(e) or type(e).__name__
+    startup_report.record(f"warm-up {name}", time.perf_counter() - started)
+
+
+async def warm_up_services():
+    """
+    Initialize external clients concurrently in the background.
+    The server accepts connections meanwhile; anything not warmed yet is
+    created lazily on first use.
+    """
+    from app.services.gemini_service import gemini_service
+    from app.services.supabase_service import supabase_service
+    from app.services.cloudinary_service import cloudinary_service
+    from app.db.session import get_engine
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        _warm_up("gemini", lambda: gemini_service.model),
+        _warm_up("supabase", lambda: supabase_service.client),
+        _warm_up("cloudinary", lambda: cloudinary_service.sdk),
+        _warm_up("sqlalchemy", get_engine),
+    )
+    startup_report.record("warm-up total", time.perf_counter() - started)
+    startup_report.print()
@@ -0,0 +1,60 @@
+-- Convert messages into a table partitioned by month on created_at.
+-- Run once (e.g. in the Supabase SQL editor) after schema.sql.
+-- Afterwards the backend's archive job (app/services/archive_service.py)
+-- creates upcoming monthly partitions and archives old ones.
+
+begin;
+
+-- Partitioned tables cannot be referenced by a foreign key on id alone.
+alter table moderation_logs drop constraint if exists moderation_logs_message_id_fkey;
+
+alter table messages rename to messages_unpartitioned;
+alter index if exists idx_messages_search_vector rename to idx_messages_unpartitioned_search_vector;
+
+create table messages (like messages_unpartitioned including defaults including generated)
+  partition by range (created_at);
+alter table messages alter column created_at set not null;
+-- The partition key must be part of the primary key.
+alter table messages add primary key (id, created_at);
+create index if not exists idx_messages_room_created_at on messages (room_id, created_at desc);
+create index if not exists idx_messages_search_vector on messages
+  using gin (search_vector) where status is distinct from 'blocked';
+
+-- "like" does not copy row level security; recreate the policies from db/schema.sql
+-- (the old ones are dropped together with messages_unpartitioned).
+alter table messages enable row level security;
+
+create policy "Allow read access for all"
+  on messages for select
+  using (true);
+
+create policy "Allow insert access for all"
+  on messages for insert
+  with check (true);
+
+-- One partition per month from the oldest existing message through two months ahead.
+-- Partitions get RLS without policies, so they are not readable or writable
+-- directly with the anon key; access goes through messages and its policies.
+do $$
+declare
+  m date := date_trunc('month', coalesce((select min(created_at) from messages_unpartitioned), now()))::date;
+begin
+  while m <= (date_trunc('month', now()) + interval '2 months')::date loop
+    execute format(
+      'create table if not exists %I partition of messages for values from (%L) to (%L)',
+      'messages_' || to_char(m, 'YYYY_MM'), m, (m + interval '1 month')::date
+    );
+    execute format('alter table %I enable row level security', 'messages_' || to_char(m, 'YYYY_MM'));
+    m := (m + interval '1 month')::date;
+  end loop;
+end $$;
+
+insert into messages (id, room_id, user_id, content, type, file_url, status, created_at,
+                      moderation_status, moderation_details)
+select id, room_id, user_id, content, type, file_url, status, created_at,
+       moderation_status, moderation_details
+from messages_unpartitioned;
+
+drop table messages_unpartitioned;
+
+commit;
@@ -36,3 +36,107 @@ alter table messages add column if not exists moderation_details jsonb;
 
 -- Policy helper (if RLS is enabled, but we are using service role for backend usually, 
 -- though Supabase-py is client. We assume backend handles auth logic for now).
+
+-- Full-text search on messages.
+-- The tsvector is a generated column, so every insert_message write keeps it
+-- (and the GIN index) up to date without application code.
+alter table messages add column if not exists search_vector tsvector
+  generated always as (to_tsvector('english', coalesce(content, ''))) stored;
+
+-- Partial index: blocked messages are never searchable, so they are not indexed.
+create index if not exists idx_messages_search_vector on messages
+  using gin (search_vector) where status is distinct from 'blocked';
+
+-- Ranked search over the conversations a user participates in.
+-- Keyset pagination on (rank, id): pass the last row's rank and id to get the next page.
+-- ts_headline only runs on the returned page.
+create or replace function search_messages(
+  p_user_id uuid,
+  p_query text,
+  p_limit int default 20,
+  p_cursor_rank real default null,
+  p_cursor_id uuid default null
+)
+returns table (id uuid, room_id text, user_id text, content text, created_at timestamptz, rank real, snippet text)
+language sql stable
+as $$
+  with q as (
+    select websearch_to_tsquery('english', p_query) as query
+  ),
+  page as (
+    select m.id, m.room_id, m.user_id::text as user_id, m.content, m.created_at,
+           ts_rank(m.search_vector, q.query) as rank
+    from messages m, q
+    where m.search_vector @@ q.query
+      and m.status is distinct from 'blocked'
+      and m.room_id in (select p.conversation_id::text from participants p where p.user_id = p_user_id)
+      and (p_cursor_rank is null
+           or (ts_rank(m.search_vector, q.query), m.id) < (p_cursor_rank, p_cursor_id))
+    order by rank desc, m.id desc
+    limit p_limit
+  )
+  select page.id, page.room_id, page.user_id, page.content, page.created_at, page.rank,
+         ts_headline('english', page.content, q.query,
+                     'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5') as snippet
+  from page, q
+  order by page.rank desc, page.id desc;
+$$;
+
+-- Moderation counters compacted from Redis (see app/services/stats_service.py)
+create table if not exists moderation_rollups (
+  granularity text not null, -- 'hour', 'day'
+  bucket_start timestamp with time zone not null,
+  counts jsonb not null,
+  updated_at timestamp with time zone default timezone('utc'::text, now()) not null,
+  primary key (granularity, bucket_start)
+);
+
+-- Direct (1-on-1) conversations are unique per user pair.
+-- pair_key = '<smaller uuid>:<larger uuid>'
+alter table conversations add column if not exists pair_key text;
+
+-- Backfill: the oldest conversation of each existing pair gets the key;
+-- later duplicates keep a null pair_key.
+update conversations c
+set pair_key = first.pair_key
+from (
+  select distinct on (pairs.pair_key) pairs.conversation_id, pairs.pair_key
+  from (
+    select p.conversation_id,
+           string_agg(p.user_id::text, ':' order by p.user_id) as pair_key
+    from participants p
+    group by p.conversation_id
+    having count(*) = 2
+  ) pairs
+  join conversations conv on conv.id = pairs.conversation_id
+  order by pairs.pair_key, conv.created_at
+) first
+where c.id = first.conversation_id and c.pair_key is null;
+
+create unique index if not exists idx_conversations_pair_key on conversations (pair_key);
+
+-- Atomic get-or-create: concurrent callers for the same pair block on the
+-- unique index and then read the single winning row.
+create or replace function get_or_create_direct_conversation(p_user_a uuid, p_user_b uuid)
+returns uuid
+language plpgsql
+as $$
+declare
+  v_key text := least(p_user_a, p_user_b)::text || ':' || greatest(p_user_a, p_user_b)::text;
+  v_id uuid;
+begin
+  insert into conversations (pair_key) values (v_key)
+  on conflict (pair_key) do nothing
+  returning id into v_id;
+
+  if v_id is null then
+    select id into v_id from conversations where pair_key = v_key;
+  else
+    insert into participants (conversation_id, user_id)
+    values (v_id, p_user_a), (v_id, p_user_b)
+    on conflict do nothing;
+  end if;
+
+  return v_id;
+end;
+$$;
@@ -85,37 +85,26 @@ export const ChatLayout = () => {
 
         setIsUploading(true);
         try {
-            // 1. Get Signature
-            const signRes = await axios.post('/api/upload/sign', {}, {
-                headers: { Authorization: `Bearer ${token}` }
+            // Stream the file to the backend, which stores it and returns an
+            // attachment reference; the server resolves it to file_url.
+            const uploadRes = await axios.post('/api/upload', file, {
+                params: { filename: file.name },
+                headers: {
+                    Authorization: `Bearer ${token}`,
+                    'Content-Type': file.type || 'application/octet-stream'
+                }
             });
-            const { signature, timestamp, api_key, cloud_name, folder } = signRes.data;
-
-            // 2. Upload to Cloudinary
-            // Use 'auto' resource type so Cloudinary detects image/video/raw
-            const formData = new FormData();
-            formData.append('file', file);
-            formData.append('api_key', api_key);
-            formData.append('timestamp', timestamp);
-            formData.append('signature', signature);
-            formData.append('folder', folder);
 
-            const uploadRes = await axios.post(
-                `https://api.cloudinary.com/v1_1/${cloud_name}/auto/upload`,
-                formData
-            );
+            const { id, content_type } = uploadRes.data;
 
-            const { secure_url, resource_type, format } = uploadRes.data;
-            
-            // Map Cloudinary types to app types
-            // resource_type: 'image', 'video', 'raw'
+            // Map content types to app types
             let msgType = 'document';
-            if (resource_type === 'image') msgType = 'image';
-            if (resource_type === 'video') msgType = 'video';
-            
+            if (content_type.startsWith('image/')) msgType = 'image';
+            if (content_type.startsWith('video/')) msgType = 'video';
+
             // Send as message
-            // Content is filename, type is media type, file_url is the link
-            sendMessage(file.name, msgType, secure_url);
+            // Content is filename, type is media type, attachment_id is the upload
+            sendMessage(file.name, msgType, id);
 
         } catch (error) {
             console.error("Upload failed", error);
@@ -220,7 +209,10 @@ export const ChatLayout = () => {
 
                         {/* Messages */}
                         <div className="flex-1 overflow-y-auto p-4 space-y-2 bg-[url('https://user-images.githubusercontent.com/15075759/28719144-86dc0f70-73b1-11e7-911d-60d70fcded21.png')] bg-repeat bg-opacity-10">
-                            {messages.map((msg, idx) => (
+                            {messages
+                                // Retracted messages stay visible (as blocked) only to their sender
+                                .filter(msg => !msg.retracted || (user && msg.user_id === user.id))
+                                .map((msg, idx) => (
                                 <MessageBubble 
                                     key={msg.id || idx} 
                                     message={msg} 
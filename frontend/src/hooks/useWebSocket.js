@@ -5,12 +5,14 @@ export const useWebSocket = (roomId, token) => {
     const [messages, setMessages] = useState([]);
     const [isConnected, setIsConnected] = useState(false);
     const ws = useRef(null);
+    const lastStreamId = useRef(null);
 
     useEffect(() => {
         if (!roomId || !token) return;
 
         // Reset messages and fetch history
         setMessages([]);
+        lastStreamId.current = null;
         const fetchHistory = async () => {
              try {
                  const res = await axios.get(`/api/history/${roomId}`);
@@ -19,53 +21,104 @@ export const useWebSocket = (roomId, token) => {
                      ...msg,
                      timestamp: msg.timestamp || (msg.created_at ? new Date(msg.created_at).getTime() / 1000 : Date.now() / 1000)
                  }));
-                 setMessages(history);
+                 // Merge rather than replace: on a refetch after reconnecting,
+                 // live messages may already have arrived.
+                 setMessages((prev) => {
+                     const known = new Set(prev.map(m => m.id));
+                     const missing = history.filter(m => !known.has(m.id));
+                     return missing.length ? [...prev, ...missing].sort((a, b) => a.timestamp - b.timestamp) : prev;
+                 });
              } catch (e) {
                  console.error("Failed to fetch history", e);
              }
         };
         fetchHistory();
 
-        // Connect to WebSocket with token
-        const socket = new WebSocket(`ws://localhost:8000/ws/${roomId}/${token}`);
-        
-        socket.onopen = () => {
-            console.log('Connected to WebSocket');
-            setIsConnected(true);
-        };
+        // Connect to WebSocket with token.
+        // On reconnect, pass the last seen stream_id so the server replays only
+        // the missed messages. Without one (no live message seen yet), refetch
+        // history instead so the gap is not lost.
+        let socket = null;
+        let closedByUs = false;
+        let hasConnected = false;
+        let retryDelay = 1000;
+        let retryTimer = null;
 
-        socket.onmessage = (event) => {
-            try {
-                const message = JSON.parse(event.data);
-                // Ensure timestamp exists
-                if (!message.timestamp) message.timestamp = Date.now() / 1000;
-                
-                setMessages((prev) => [...prev, message]);
-            } catch (e) {
-                console.error('Error parsing message:', e);
+        const handleMessage = (message) => {
+            // Ensure timestamp exists
+            if (!message.timestamp) {
+                message.timestamp = message.created_at ? new Date(message.created_at).getTime() / 1000 : Date.now() / 1000;
+            }
+            if (message.stream_id) lastStreamId.current = message.stream_id;
+
+            // A message delivered before moderation turned out to be blocked
+            if (message.event === 'retract') {
+                setMessages((prev) => prev.map(m => m.id === message.id
+                    ? { ...m, status: 'blocked', moderation: message.moderation, retracted: true }
+                    : m));
+                return;
             }
-        };
 
-        socket.onclose = (e) => {
-            console.log('Disconnected from WebSocket', e.code);
-            setIsConnected(false);
+            // Replayed messages may overlap what we already have
+            setMessages((prev) => (message.id && prev.some(m => m.id === message.id)) ? prev : [...prev, message]);
         };
 
-        ws.current = socket;
+        const connect = () => {
+            // batch=1: busy rooms may coalesce several messages into one frame
+            const params = new URLSearchParams({ batch: '1' });
+            if (lastStreamId.current) params.set('last_id', lastStreamId.current);
+            socket = new WebSocket(`ws://localhost:8000/ws/${roomId}/${token}?${params}`);
+
+            socket.onopen = () => {
+                console.log('Connected to WebSocket');
+                setIsConnected(true);
+                retryDelay = 1000;
+                if (hasConnected && !lastStreamId.current) fetchHistory();
+                hasConnected = true;
+            };
+
+            socket.onmessage = (event) => {
+                try {
+                    const message = JSON.parse(event.data);
+                    if (message.event === 'batch') {
+                        message.messages.forEach(handleMessage);
+                    } else {
+                        handleMessage(message);
+                    }
+                } catch (e) {
+                    console.error('Error parsing message:', e);
+                }
+            };
+
+            socket.onclose = (e) => {
+                console.log('Disconnected from WebSocket', e.code);
+                setIsConnected(false);
+                // 4003 = invalid session; don't retry
+                if (!closedByUs && e.code !== 4003) {
+                    retryTimer = setTimeout(connect, retryDelay);
+                    retryDelay = Math.min(retryDelay * 2, 30000);
+                }
+            };
+
+            ws.current = socket;
+        };
+        connect();
 
         return () => {
+            closedByUs = true;
+            clearTimeout(retryTimer);
             socket.close();
         };
     }, [roomId, token]);
 
-    const sendMessage = useCallback((content, type = 'text', fileUrl = null) => {
+    const sendMessage = useCallback((content, type = 'text', attachmentId = null) => {
         if (ws.current && ws.current.readyState === WebSocket.OPEN) {
+            // The server fills in file_url, status, ids etc.; other fields are ignored
             const message = {
                 content,
                 type, // 'text', 'image', 'document', 'video'
-                file_url: fileUrl,
-                timestamp: Date.now()
             };
+            if (attachmentId) message.attachment_id = attachmentId;
             ws.current.send(JSON.stringify(message));
         }
     }, []);